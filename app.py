@@ -4,14 +4,39 @@ ORBIT Link Setup - TikTok Account Deployment Tool
 Deploys Netlify landing pages and Cloudflare Workers for click tracking
 """
 
-from flask import Flask, Response, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+from asgiref.wsgi import WsgiToAsgi
+import httpx
 import requests as http_requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
 import hashlib
+import inspect
+import itertools
+import json
 import base64
+import bisect
+import contextvars
+import functools
+import multiprocessing
 import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageFilter
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -21,12 +46,831 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max request size
 CLOUDFLARE_API_TOKEN = os.environ.get("CLOUDFLARE_API_TOKEN", "")
 CLOUDFLARE_ACCOUNT_ID = "ac958f158fdec62e9941d8de02bf2ac2"
 NETLIFY_API_TOKEN = os.environ.get("NETLIFY_API_TOKEN", "")
-SUPABASE_URL = "https://utzkvosladgdsbpujozu.supabase.co"
+SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://utzkvosladgdsbpujozu.supabase.co")  # override to point at a local PostgREST stub
 SUPABASE_SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_KEY", "")
 
-# Active creators with their OF URLs and background images
+# Bulk deploys: parallel Netlify deploys per request, and max handles per request. A handle
+# takes about four Netlify calls at ~8/s, so lists longer than BULK_DEPLOY_SYNC_MAX_HANDLES
+# run as a job instead of inside the request (gunicorn kills requests after 120 s)
+BULK_DEPLOY_CONCURRENCY = int(os.environ.get("BULK_DEPLOY_CONCURRENCY", "8"))
+BULK_DEPLOY_MAX_HANDLES = 250
+BULK_DEPLOY_SYNC_MAX_HANDLES = 10
+
+# Parallel Cloudflare script uploads in redeploy-all-workers
+REDEPLOY_CONCURRENCY = int(os.environ.get("REDEPLOY_CONCURRENCY", "4"))
+
+# Parallel Netlify site deploys in redeploy-all-pages
+PAGE_REDEPLOY_CONCURRENCY = int(os.environ.get("PAGE_REDEPLOY_CONCURRENCY", "8"))
+# Sites per request when listing the Netlify account's sites (Netlify's maximum is 100)
+NETLIFY_SITES_PAGE_SIZE = 100
+
+# Outbound HTTP: (connect, read) timeouts in seconds and retries, see HTTP_POOL_SIZE for the pools
+HTTP_TIMEOUT = (
+    float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5")),
+    float(os.environ.get("HTTP_READ_TIMEOUT", "30")),
+)
+HTTP_MAX_RETRIES = 3
+
+# Client-side rate limits: starting requests/second and burst per provider. Providers
+# that send rate-limit headers are then paced by those (up to RATE_LIMIT_MAX), the others
+# never above their starting rate. Rate-limited calls are queued and retried for up to
+# RATE_LIMIT_MAX_WAIT seconds before the 429 is returned
+PROVIDER_RATE_LIMITS = {
+    "netlify": (8.0, 10),
+    "cloudflare": (4.0, 8),
+    "supabase": (20.0, 20),
+}
+RATE_LIMIT_MIN = 0.2
+RATE_LIMIT_MAX = 50.0
+RATE_LIMIT_MAX_WAIT = float(os.environ.get("RATE_LIMIT_MAX_WAIT", "300"))
+# Provider calls made while serving a request stop queueing once the request has run this
+# long, so it fails with an error instead of gunicorn (--timeout 120) killing the worker.
+# Jobs have no deadline and only RATE_LIMIT_MAX_WAIT applies
+REQUEST_PROVIDER_DEADLINE = float(os.environ.get("REQUEST_PROVIDER_DEADLINE", "90"))
+
+# Local state shared by all gunicorn workers on this machine
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+IMAGE_CACHE_DIR = os.path.join(DATA_DIR, "image-cache")
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_MB", "256")) * 1024 * 1024
+DATABASE_PATH = os.path.join(DATA_DIR, "link-setup.db")
+
+# Background image processing: process pool size, max jobs waiting per worker,
+# and the decompression-bomb limit
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+IMAGE_QUEUE_SIZE = int(os.environ.get("IMAGE_QUEUE_SIZE", "8"))
+IMAGE_QUEUE_TIMEOUT = 30
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", "50000000"))
+BACKGROUND_MAX_WIDTH = 1920
+
+# Smaller responsive variants emitted next to the full-size background (JPEG + WebP each),
+# and the width of the blurred placeholder inlined into the page
+BACKGROUND_VARIANT_WIDTHS = (480, 828, 1080)
+BACKGROUND_PLACEHOLDER_WIDTH = 24
+# Bump when the image pipeline output changes, so stale cache entries are ignored
+IMAGE_PIPELINE_VERSION = 2
+
+# Async deploy jobs: jobs run in parallel per web worker, idle poll interval, and how
+# long a running job may go without progress before another worker picks it up again
+JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", "4"))
+JOB_POLL_INTERVAL = 1.0
+JOB_STALE_SECONDS = 600
+JOB_UPLOAD_DIR = os.path.join(DATA_DIR, "job-uploads")
+
+# Keep-alive connections per provider per worker: enough for the request thread and every
+# job to run their widest fan-out at once, so urllib3 never opens connections it then
+# discards ("Connection pool is full")
+HTTP_POOL_SIZE = (JOB_CONCURRENCY + 1) * max(BULK_DEPLOY_CONCURRENCY, PAGE_REDEPLOY_CONCURRENCY, REDEPLOY_CONCURRENCY)
+
+# How long to wait for a Netlify deploy to reach "ready" before forcing a full upload
+NETLIFY_READY_TIMEOUT = float(os.environ.get("NETLIFY_READY_TIMEOUT", "15"))
+NETLIFY_READY_POLL_INTERVAL = 0.5
+
+# Netlify deploy mode: "digest" (manifest, then one PUT per missing file), "zip" (the whole
+# site in one request) or "auto". Auto zips when at least NETLIFY_ZIP_MIN_FILES files are
+# missing from Netlify and they are most of the site's bytes, so a zip doesn't resend
+# content Netlify already has, and the site is at most NETLIFY_ZIP_MAX_BYTES
+NETLIFY_DEPLOY_MODE = os.environ.get("NETLIFY_DEPLOY_MODE", "auto")
+NETLIFY_ZIP_MIN_FILES = 2
+NETLIFY_ZIP_MIN_MISSING_SHARE = 0.5
+NETLIFY_ZIP_MAX_BYTES = 25 * 1024 * 1024
+
+# Uploaded backgrounds are hosted once per creator on this Netlify site ({prefix}{creator})
+# and handle pages link to them, so a handle deploy only ships its HTML
+NETLIFY_ASSET_SITE_PREFIX = os.environ.get("NETLIFY_ASSET_SITE_PREFIX", "assets-")
+
+# Serve all handles of a creator from one site ({prefix}{creator}.netlify.app/{handle}/)
+# instead of a tt-{handle} site each. Handles moved over get a redirect on their old site
+NETLIFY_CONSOLIDATED_SITES = os.environ.get("NETLIFY_CONSOLIDATED_SITES", "") in ("1", "true")
+NETLIFY_CREATOR_SITE_PREFIX = "links-"
+
+# Progress of a failed deploy is resumed by a retry within this many seconds
+DEPLOY_RESUME_MAX_AGE = 6 * 3600
+
+# Click analytics: raw clicks are folded into local hourly rollups at most every
+# STATS_REFRESH_INTERVAL seconds, STATS_PAGE_SIZE rows per Supabase request and up to
+# STATS_REFRESH_MAX_PAGES pages per refresh. Clicks newer than STATS_SETTLE_SECONDS are
+# left for the next refresh, since batched workers insert them a few seconds late
+STATS_REFRESH_INTERVAL = int(os.environ.get("STATS_REFRESH_INTERVAL", "60"))
+STATS_PAGE_SIZE = 1000
+STATS_REFRESH_MAX_PAGES = 50
+STATS_SETTLE_SECONDS = 120
+STATS_DEFAULT_DAYS = 7
+
+# Timing histograms: bucket bounds in seconds, and how often each gunicorn worker
+# adds what it observed to the shared totals that /metrics reports
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRICS_FLUSH_INTERVAL = 5.0
+
+
+def parse_rate_limit_headers(headers):
+    """(remaining, seconds until reset) from a provider's rate-limit headers, or None
+
+    Understands X-RateLimit-* (Netlify; reset is an epoch timestamp) and the
+    RateLimit-* / combined RateLimit headers (reset in seconds).
+    """
+    remaining = headers.get("X-RateLimit-Remaining") or headers.get("RateLimit-Remaining")
+    reset = headers.get("X-RateLimit-Reset") or headers.get("RateLimit-Reset")
+    if remaining is None and "RateLimit" in headers:
+        fields = dict(
+            part.strip().split("=", 1) for part in headers["RateLimit"].split(",") if "=" in part
+        )
+        remaining, reset = fields.get("remaining"), fields.get("reset")
+    try:
+        remaining, reset = float(remaining), float(reset)
+    except (TypeError, ValueError):
+        return None
+    if reset > 1e9:
+        reset -= time.time()
+    return remaining, max(reset, 0.0)
+
+
+# time.monotonic() by which the current request's provider calls must have started, see
+# REQUEST_PROVIDER_DEADLINE. None outside requests (job threads)
+provider_deadline = contextvars.ContextVar("provider_deadline", default=None)
+
+
+class RateLimitWaitExceeded(Exception):
+    """The provider's rate limit would hold a call past its deadline"""
+
+
+def submit_in_context(pool, fn, *args):
+    """pool.submit() that runs fn with the caller's context variables (e.g. provider_deadline)"""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def provider_wait_budget(queued_at):
+    """Seconds a provider call queued at queued_at may still wait for its turn"""
+    budget = RATE_LIMIT_MAX_WAIT - (time.monotonic() - queued_at)
+    deadline = provider_deadline.get()
+    if deadline is not None:
+        budget = min(budget, deadline - time.monotonic())
+    return budget
+
+
+def retry_after_seconds(headers, attempt):
+    """How long to back off after the attempt-th 429 (Retry-After if the provider sent one)"""
+    try:
+        return float(headers.get("Retry-After", ""))
+    except ValueError:
+        return min(0.5 * 2 ** attempt, 30)
+
+
+class RateLimiter:
+    """Adaptive token bucket shared by every call to one provider in this worker
+
+    Callers queue for a token instead of failing. The rate follows the
+    provider's rate-limit headers (remaining calls spread over the time until
+    the window resets), halves on a 429, and creeps back towards the starting
+    rate while calls without such headers succeed.
+    """
+
+    def __init__(self, rate, burst):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """Take a token, returns the seconds until this call's turn (acquire() without the wait)
+
+        Returns None without taking a token if the turn is more than max_wait seconds away.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+            self.refilled_at = now
+            ready_at = max(self.paused_until, now - min(self.tokens - 1, 0.0) / self.rate)
+            if max_wait is not None and ready_at - now > max_wait:
+                return None
+            # Take the token right away, possibly going into debt, so later callers queue behind
+            self.tokens -= 1
+        return max(ready_at - now, 0.0)
+
+    def acquire(self, max_wait=None):
+        """Wait for this call's turn, returns the seconds waited (None: see reserve())"""
+        delay = self.reserve(max_wait)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def update(self, headers):
+        """Adapt the rate to a response's rate-limit headers"""
+        limit = parse_rate_limit_headers(headers)
+        with self.lock:
+            if limit is None:
+                self.rate = min(self.base_rate, self.rate + 0.1 * self.base_rate)
+                return
+            remaining, reset_in = limit
+            if remaining < 1:
+                self.paused_until = max(self.paused_until, time.monotonic() + reset_in)
+            self.rate = min(RATE_LIMIT_MAX, max(RATE_LIMIT_MIN, remaining / max(reset_in, 0.25)))
+
+    def pause(self, seconds):
+        """Rate limited anyway: hold every caller for `seconds` and halve the rate"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.rate = max(RATE_LIMIT_MIN, self.rate / 2)
+
+
+class ProviderClient:
+    """Long-lived keep-alive HTTP client for one provider API
+
+    One instance per provider per gunicorn worker, so consecutive calls reuse
+    the pooled TCP+TLS connections instead of handshaking every time.
+    """
+
+    def __init__(self, name, base_url, auth_headers):
+        self.name = name
+        self.base_url = base_url
+        self.auth_headers = auth_headers  # callable, so tokens are read at call time
+        self.session = http_requests.Session()
+
+        # Paces every thread using this client, see RateLimiter
+        self.limiter = RateLimiter(*PROVIDER_RATE_LIMITS[name])
+
+        # Retry connection errors and transient 5xx statuses with exponential backoff.
+        # Read errors and statuses only for idempotent methods: a POST that timed out
+        # may have gone through, so it is only resent if it never reached the server
+        retry = Retry(
+            total=HTTP_MAX_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+            # 429s (and their Retry-After) are handled in request(), so the whole
+            # provider backs off and every attempt goes through the limiter
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.local = threading.local()
+
+    def thread_calls(self):
+        """Requests (attempts) this thread has sent through the client so far"""
+        return getattr(self.local, 'calls', 0)
+
+    def request(self, method, path, headers=None, **kwargs):
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        queued_at = time.monotonic()
+        attempt = 0
+        resp = None
+        while True:
+            waited = self.limiter.acquire(max(provider_wait_budget(queued_at), 0.0))
+            if waited is None:
+                return self.give_up(resp)
+            if waited:
+                metrics.observe('rate_limit_wait_seconds', waited, provider=self.name)
+            self.local.calls = self.thread_calls() + 1
+            started = time.perf_counter()
+            try:
+                resp = self.session.request(
+                    method,
+                    self.base_url + path,
+                    headers={**self.auth_headers(), **(headers or {})},
+                    **kwargs
+                )
+            except Exception:
+                metrics.observe('provider_request_seconds', time.perf_counter() - started, provider=self.name,
+                                method=method, endpoint=metric_endpoint(path), status='error')
+                raise
+            metrics.observe('provider_request_seconds', time.perf_counter() - started, provider=self.name,
+                            method=method, endpoint=metric_endpoint(path), status=resp.status_code)
+            self.limiter.update(resp.headers)
+            if resp.status_code != 429:
+                return resp
+
+            # Rate limited: back off the whole provider, then queue this call again
+            self.limiter.pause(retry_after_seconds(resp.headers, attempt))
+            attempt += 1
+
+    def give_up(self, resp):
+        """Out of time to wait for a turn: the last 429 if there was one, else raise"""
+        if resp is not None:
+            return resp
+        raise RateLimitWaitExceeded(
+            f"{self.name} rate limit: no call slot before this request's deadline, retry shortly or use async"
+        )
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+
+netlify_api = ProviderClient(
+    "netlify",
+    "https://api.netlify.com/api/v1",
+    lambda: {"Authorization": f"Bearer {NETLIFY_API_TOKEN}"},
+)
+cloudflare_api = ProviderClient(
+    "cloudflare",
+    f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}",
+    lambda: {"Authorization": f"Bearer {CLOUDFLARE_API_TOKEN}"},
+)
+supabase_api = ProviderClient(
+    "supabase",
+    SUPABASE_URL,
+    lambda: {"apikey": SUPABASE_SERVICE_KEY, "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"},
+)
+
+
+class AsyncProviderClient:
+    """Non-blocking twin of a ProviderClient for the ASGI mode (see AsgiApp)
+
+    Shares the provider's auth and RateLimiter, so sync and async calls in
+    one process are paced together. Waiting for a token or a response never
+    blocks the event loop. The httpx client is created on first use, inside
+    the loop that serves the requests.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.http = None
+        self.calls = contextvars.ContextVar(f"{client.name}_calls", default=None)
+
+    def session(self):
+        if self.http is None:
+            # httpx ignores the client's limits= once a transport is given, so the pool is sized here
+            self.http = httpx.AsyncClient(
+                timeout=httpx.Timeout(HTTP_TIMEOUT[1], connect=HTTP_TIMEOUT[0]),
+                transport=httpx.AsyncHTTPTransport(
+                    limits=httpx.Limits(max_connections=None, max_keepalive_connections=HTTP_POOL_SIZE),
+                    retries=HTTP_MAX_RETRIES,  # connection errors only
+                ),
+            )
+        return self.http
+
+    async def aclose(self):
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+    def calls_sent(self):
+        """Requests (attempts) this task has sent through the client so far, see ProviderClient.thread_calls()
+
+        Tasks started from here on (asyncio.gather) add to the same count.
+        """
+        counter = self.calls.get()
+        if counter is None:
+            counter = [0]
+            self.calls.set(counter)
+        return counter[0]
+
+    async def request(self, method, path, headers=None, **kwargs):
+        if isinstance(kwargs.get('data'), bytes):
+            kwargs['content'] = kwargs.pop('data')  # raw bodies are content= in httpx
+        queued_at = time.monotonic()
+        attempt = 0
+        resp = None
+        while True:
+            waited = self.client.limiter.reserve(max(provider_wait_budget(queued_at), 0.0))
+            if waited is None:
+                return self.client.give_up(resp)
+            if waited:
+                await asyncio.sleep(waited)
+                metrics.observe('rate_limit_wait_seconds', waited, provider=self.client.name)
+            counter = self.calls.get()
+            if counter is not None:
+                counter[0] += 1
+            started = time.perf_counter()
+            try:
+                resp = await self.session().request(
+                    method,
+                    self.client.base_url + path,
+                    headers={**self.client.auth_headers(), **(headers or {})},
+                    **kwargs
+                )
+            except Exception:
+                metrics.observe('provider_request_seconds', time.perf_counter() - started, provider=self.client.name,
+                                method=method, endpoint=metric_endpoint(path), status='error')
+                raise
+            metrics.observe('provider_request_seconds', time.perf_counter() - started, provider=self.client.name,
+                            method=method, endpoint=metric_endpoint(path), status=resp.status_code)
+            self.client.limiter.update(resp.headers)
+
+            # Transient 5xx: same backoff and methods as the sync client's urllib3 Retry
+            if (resp.status_code in (502, 503, 504) and method in Retry.DEFAULT_ALLOWED_METHODS
+                    and attempt < HTTP_MAX_RETRIES):
+                await asyncio.sleep(0.5 * 2 ** attempt)
+                attempt += 1
+                continue
+            if resp.status_code != 429:
+                return resp
+
+            # Rate limited: back off the whole provider, then queue this call again
+            self.client.limiter.pause(retry_after_seconds(resp.headers, attempt))
+            attempt += 1
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request("PUT", path, **kwargs)
+
+
+netlify_async = AsyncProviderClient(netlify_api)
+cloudflare_async = AsyncProviderClient(cloudflare_api)
+supabase_async = AsyncProviderClient(supabase_api)
+
+
+class BlockingClient:
+    """A ProviderClient behind AsyncProviderClient's interface, for the deploy coroutines run by run_blocking()"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def calls_sent(self):
+        return self.client.thread_calls()
+
+    async def get(self, path, **kwargs):
+        return self.client.get(path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return self.client.post(path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return self.client.put(path, **kwargs)
+
+
+class BlockingIO:
+    """How the deploy coroutines (the *_io functions) do I/O in gunicorn and job threads
+
+    Nothing here ever suspends: provider calls block the thread, waits are
+    time.sleep() and independent steps run one after another, so
+    run_blocking() drives a deploy to the end in a single step. EventLoopIO
+    is the same interface for the ASGI mode.
+    """
+
+    netlify = BlockingClient(netlify_api)
+    cloudflare = BlockingClient(cloudflare_api)
+    supabase = BlockingClient(supabase_api)
+
+    async def sleep(self, seconds):
+        time.sleep(seconds)
+
+    async def gather(self, *steps):
+        """Run steps in order, stopping at the first that raises"""
+        steps = list(steps)
+        try:
+            return [await step for step in steps]
+        finally:
+            for step in steps:
+                step.close()  # the steps after a failure, which never started
+
+    async def blocking(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) for work that blocks: SQLite, Pillow, the sync-only deploys"""
+        return fn(*args, **kwargs)
+
+
+class EventLoopIO:
+    """BlockingIO for the ASGI mode: provider calls on httpx, blocking work in the default executor"""
+
+    netlify = netlify_async
+    cloudflare = cloudflare_async
+    supabase = supabase_async
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    async def gather(self, *steps):
+        """Run steps concurrently, raising the first error once every step has finished"""
+        results = await asyncio.gather(*steps, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    async def blocking(self, fn, *args, **kwargs):
+        # to_thread() carries the context over, so provider_deadline still applies there
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+blocking_io = BlockingIO()
+event_loop_io = EventLoopIO()
+
+
+def run_blocking(coro):
+    """Run a deploy coroutine given blocking_io to completion on this thread, returns its result"""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    coro.close()
+    raise RuntimeError(f"{coro.__qualname__} suspended, it was given an event loop I/O")
+
+
+DATABASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS netlify_digests (
+    sha1 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    accepted_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    steps TEXT NOT NULL DEFAULT '[]',
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+
+CREATE TABLE IF NOT EXISTS worker_scripts (
+    worker_name TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    deployed_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS click_rollups (
+    hour INTEGER NOT NULL,
+    creator TEXT NOT NULL,
+    tiktok_account TEXT NOT NULL,
+    country TEXT NOT NULL,
+    device_type TEXT NOT NULL,
+    os TEXT NOT NULL,
+    clicks INTEGER NOT NULL,
+    uniques INTEGER NOT NULL,
+    PRIMARY KEY (hour, creator, tiktok_account, country, device_type, os)
+);
+CREATE INDEX IF NOT EXISTS click_rollups_creator_hour ON click_rollups (creator, hour);
+
+CREATE TABLE IF NOT EXISTS click_rollup_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    high_water_ts TEXT,
+    high_water_id INTEGER,
+    refreshed_at REAL NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO click_rollup_state (id) VALUES (1);
+
+CREATE TABLE IF NOT EXISTS creators (
+    name TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS creators_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO creators_version (id, version) VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS deployments (
+    handle TEXT PRIMARY KEY,
+    creator TEXT,
+    site_id TEXT NOT NULL,
+    deploy_id TEXT,
+    files TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL,
+    deployed_at REAL
+);
+CREATE INDEX IF NOT EXISTS deployments_creator_handle ON deployments (creator, handle);
+
+-- A handle's own tt-{handle} site. deployments.site_id is where its page is served,
+-- which is the creator's site once it moved to a consolidated one
+CREATE TABLE IF NOT EXISTS handle_sites (
+    handle TEXT PRIMARY KEY,
+    site_id TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS page_sources (
+    handle TEXT PRIMARY KEY,
+    background_url TEXT NOT NULL,
+    variants TEXT,
+    placeholder TEXT
+);
+
+CREATE TABLE IF NOT EXISTS deploy_progress (
+    key TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS asset_sites (
+    creator TEXT PRIMARY KEY,
+    site_id TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS creator_sites (
+    creator TEXT PRIMARY KEY,
+    site_id TEXT NOT NULL
+);
+INSERT OR IGNORE INTO handle_sites (handle, site_id)
+    SELECT handle, site_id FROM deployments WHERE site_id NOT IN (SELECT site_id FROM creator_sites);
+
+CREATE TABLE IF NOT EXISTS asset_images (
+    url TEXT PRIMARY KEY,
+    creator TEXT NOT NULL,
+    files TEXT NOT NULL,
+    variants TEXT NOT NULL,
+    placeholder TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS asset_images_creator ON asset_images (creator);
+
+CREATE TABLE IF NOT EXISTS metric_buckets (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    le REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (name, labels, le)
+);
+
+CREATE TABLE IF NOT EXISTS metric_totals (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    sum REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (name, labels)
+);
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def db_connect():
+    """Open a connection to the local SQLite database shared by all workers"""
+    global _schema_ready
+    os.makedirs(DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(DATABASE_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(DATABASE_SCHEMA)
+                _schema_ready = True
+    return conn
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+#
+# Histograms are observed into a per-worker dict (a lock and a few additions
+# per observation) and a flusher thread adds the deltas to the shared database
+# every METRICS_FLUSH_INTERVAL, so /metrics reports totals across all gunicorn
+# workers, including ones that have since restarted.
+# ---------------------------------------------------------------------------
+
+METRIC_PREFIX = "link_setup_"
+
+METRIC_HELP = {
+    'stage_seconds': "Time spent in one stage of a deploy",
+    'provider_request_seconds': "Time per Netlify/Cloudflare/Supabase API call attempt",
+    'http_request_seconds': "Time to serve an endpoint, until the response is fully sent",
+    'rate_limit_wait_seconds': "Time a provider call was held back by the client-side rate limiter",
+}
+
+
+def metric_endpoint(path):
+    """Collapse ids in a provider API path so it can be a label: /sites/abc/deploys -> /sites/:id/deploys"""
+    parts = path.split('?')[0].strip('/').split('/')
+    endpoint = []
+    for i, part in enumerate(parts):
+        if i and parts[i - 1] in ('sites', 'deploys', 'scripts'):
+            part = ':id'
+        endpoint.append(part)
+        if part == 'files':
+            break  # file paths would be a label per file
+    return '/' + '/'.join(endpoint)
+
+
+class Metrics:
+    """Timing histograms aggregated across gunicorn workers through the shared database"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.pending = {}  # (name, ((label, value), ...)) -> [per-bucket counts, sum, count]
+        self.flusher = None
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None:
+                entry = self.pending[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += seconds
+            entry[2] += 1
+        if self.flusher is None:
+            self.start()
+
+    @contextmanager
+    def time(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def start(self):
+        # Started lazily on the first observation, so only processes that observe run one
+        with self.lock:
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+                self.flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Add what this worker observed since the last flush to the shared totals"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        try:
+            with db_connect() as conn:
+                conn.executemany(
+                    "INSERT INTO metric_buckets (name, labels, le, count) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (name, labels, le) DO UPDATE SET count = count + excluded.count",
+                    [
+                        (name, json.dumps(labels), le, count)
+                        for (name, labels), (counts, _, _) in pending.items()
+                        for le, count in zip(self.buckets, counts) if count
+                    ]
+                )
+                conn.executemany(
+                    "INSERT INTO metric_totals (name, labels, sum, count) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (name, labels) DO UPDATE SET sum = sum + excluded.sum, count = count + excluded.count",
+                    [(name, json.dumps(labels), total, count) for (name, labels), (_, total, count) in pending.items()]
+                )
+        except sqlite3.Error:
+            # Keep the deltas for the next flush
+            with self.lock:
+                for key, (counts, total, count) in pending.items():
+                    entry = self.pending.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+                    entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                    entry[1] += total
+                    entry[2] += count
+
+    def render(self):
+        """All histograms in the Prometheus text exposition format"""
+        self.flush()
+        with db_connect() as conn:
+            totals = conn.execute("SELECT name, labels, sum, count FROM metric_totals ORDER BY name, labels").fetchall()
+            buckets = {}
+            for row in conn.execute("SELECT name, labels, le, count FROM metric_buckets"):
+                buckets.setdefault((row['name'], row['labels']), {})[row['le']] = row['count']
+
+        lines = []
+        current = None
+        for row in totals:
+            name = METRIC_PREFIX + row['name']
+            if name != current:
+                current = name
+                lines.append(f"# HELP {name} {METRIC_HELP.get(row['name'], row['name'])}")
+                lines.append(f"# TYPE {name} histogram")
+            labels = json.loads(row['labels'])
+            counts = buckets.get((row['name'], row['labels']), {})
+            cumulative = 0
+            for le in self.buckets:
+                cumulative += counts.get(le, 0)
+                lines.append(f"{name}_bucket{format_labels(labels + [('le', le)])} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels + [('le', '+Inf')])} {row['count']}")
+            lines.append(f"{name}_sum{format_labels(labels)} {row['sum']}")
+            lines.append(f"{name}_count{format_labels(labels)} {row['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    """[(name, value)] -> {name="value",...} with Prometheus escaping"""
+    escaped = (
+        (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels
+    )
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+metrics = Metrics(METRICS_BUCKETS)
+
+
+# Creators the registry starts out with (new entries here are added on the next start,
+# existing ones are left as the registry has them). The live list is creator_registry
 # background: URL to default background image (None = needs upload)
-CREATORS_CONFIG = {
+SEED_CREATORS = {
     "miriam": {"of_us": "https://onlyfans.com/milosmiriam", "of_de": "https://onlyfans.com/miriamxde", "has_dach": True, "worker": "miri2", "background": "https://tt-glowingmiriam.netlify.app/background.jpg"},
     "aurelia": {"of_us": "https://onlyfans.com/aurelialuv", "of_de": "https://onlyfans.com/aureliaxde", "has_dach": True, "background": None},
     "naomi": {"of_us": "https://onlyfans.com/naomidoee", "of_de": None, "has_dach": False, "background": None},
@@ -41,12 +885,314 @@ CREATORS_CONFIG = {
     "lily": {"of_us": "https://onlyfans.com/lilyoutlaw", "of_de": None, "has_dach": False, "background": None},
 }
 
+# How generated workers decide is_unique for a click:
+#   "select" - look the fingerprint up, then insert the click (2 subrequests)
+#   "rpc"    - one call to the log_click() function, see SUPABASE_LOG_CLICK_SQL
+WORKER_CLICK_DEDUP = os.environ.get("WORKER_CLICK_DEDUP", "select")
+# Buffer clicks per isolate and insert them as one multi-row request once this many
+# are queued or the oldest is this old. A batch size of 0 or 1 logs every click directly
+WORKER_CLICK_BATCH_SIZE = int(os.environ.get("WORKER_CLICK_BATCH_SIZE", "0"))
+WORKER_CLICK_BATCH_MAX_AGE_MS = int(os.environ.get("WORKER_CLICK_BATCH_MAX_AGE_MS", "5000"))
+# Name of the one worker script serving every creator (https://{name}.signaturenorthwest.workers.dev/{creator}).
+# Empty keeps the one-script-per-creator setup. A {name}2.workers.dev host always runs that creator's
+# own script, so creators that had one before moving keep it, updated alongside, see legacy_worker_name()
+MULTI_TENANT_WORKER = os.environ.get("MULTI_TENANT_WORKER", "")
 
-def generate_worker_code(model_name, of_url_us, of_url_de):
-    """Generate Cloudflare Worker code for a creator - with hardcoded credentials (env bindings don't work)"""
+
+class CreatorRegistry:
+    """Creator configs persisted in the shared database
+
+    Every gunicorn worker keeps a read-through snapshot of all creators and
+    re-reads them only when the registry version has moved, so a creator added
+    in one worker shows up in the others and survives restarts. Snapshots are
+    shared, treat them as read-only and write through put() or update().
+    """
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.seeded = False
+        self.current = (None, {})
+
+    def _seed(self, conn):
+        added = 0
+        for name, config in self.seed.items():
+            added += conn.execute(
+                "INSERT OR IGNORE INTO creators (name, config, updated_at) VALUES (?, ?, ?)",
+                (name, json.dumps(config), time.time())
+            ).rowcount
+        if added:
+            conn.execute("UPDATE creators_version SET version = version + 1 WHERE id = 1")
+
+    def load(self):
+        """Returns (version, {name: config}), re-reading the creators only after a change"""
+        if not self.seeded:
+            with self.lock:
+                if not self.seeded:
+                    # Commit the seed before other threads may skip it and read the creators
+                    with db_connect() as conn:
+                        self._seed(conn)
+                    self.seeded = True
+        with db_connect() as conn:
+            # One-row lookup per call; the creators themselves are only read when it moved
+            version = conn.execute("SELECT version FROM creators_version WHERE id = 1").fetchone()[0]
+            current = self.current
+            if current[0] == version:
+                return current
+            rows = conn.execute("SELECT name, config FROM creators ORDER BY rowid").fetchall()
+
+        current = (version, {row['name']: json.loads(row['config']) for row in rows})
+        self.current = current
+        return current
+
+    def snapshot(self):
+        return self.load()[1]
+
+    def get(self, name):
+        return self.snapshot().get(name)
+
+    def put(self, name, config):
+        """Create or replace a creator's config and bump the registry version"""
+        with db_connect() as conn:
+            conn.execute(
+                "INSERT INTO creators (name, config, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET config = excluded.config, updated_at = excluded.updated_at",
+                (name, json.dumps(config), time.time())
+            )
+            conn.execute("UPDATE creators_version SET version = version + 1 WHERE id = 1")
+
+    def update(self, name, changes, drop=()):
+        """Merge changes into a creator's config (creating it if new), removing the keys in drop
+
+        Read and written in one transaction, so keys set elsewhere in the
+        meantime (a hosted background, a legacy worker name) are kept.
+        """
+        with db_connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT config FROM creators WHERE name = ?", (name,)).fetchone()
+            config = {**(json.loads(row['config']) if row else {}), **changes}
+            for key in drop:
+                config.pop(key, None)
+            conn.execute(
+                "INSERT INTO creators (name, config, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET config = excluded.config, updated_at = excluded.updated_at",
+                (name, json.dumps(config), time.time())
+            )
+            conn.execute("UPDATE creators_version SET version = version + 1 WHERE id = 1")
+
+
+creator_registry = CreatorRegistry(SEED_CREATORS)
+
+
+# checkUniqueAndLog() variants for the worker template, keyed by WORKER_CLICK_DEDUP
+CHECK_UNIQUE_AND_LOG_JS = {
+    "select": '''async function checkUniqueAndLog(supabaseUrl, serviceKey, payload) {
+  if (rememberFingerprint(payload.fingerprint_hash)) {
+    payload.is_unique = false;
+  } else {
+    // Check if fingerprint has been seen before
+    const checkUrl = supabaseUrl + "/rest/v1/link_clicks?fingerprint_hash=eq." + payload.fingerprint_hash + "&select=id&limit=1";
+    try {
+      const res = await fetch(checkUrl, {
+        headers: { apikey: serviceKey, Authorization: "Bearer " + serviceKey }
+      });
+      const existing = await res.json();
+      payload.is_unique = existing.length === 0;
+    } catch (_) {
+      payload.is_unique = false;
+    }
+  }
+
+  // Insert click
+  await insertClicks(supabaseUrl, serviceKey, payload);
+}''',
+    "rpc": '''async function checkUniqueAndLog(supabaseUrl, serviceKey, payload) {
+  if (rememberFingerprint(payload.fingerprint_hash)) {
+    payload.is_unique = false;
+    await insertClicks(supabaseUrl, serviceKey, payload);
+    return;
+  }
+
+  // Single round trip: log_click() claims the fingerprint and inserts the click atomically
+  await fetch(supabaseUrl + "/rest/v1/rpc/log_click", {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      apikey: serviceKey,
+      Authorization: "Bearer " + serviceKey,
+    },
+    body: JSON.stringify({ payload }),
+  }).catch(() => null);
+}''',
+}
+
+# Batched counterparts of CHECK_UNIQUE_AND_LOG_JS, used when WORKER_CLICK_BATCH_SIZE > 1
+CHECK_UNIQUE_AND_LOG_BATCH_JS = {
+    "select": '''async function checkUniqueAndLogBatch(supabaseUrl, serviceKey, payloads) {
+  const fresh = [];
+  for (const payload of payloads) {
+    if (rememberFingerprint(payload.fingerprint_hash)) payload.is_unique = false;
+    else fresh.push(payload);
+  }
+
+  // One lookup for every fingerprint this isolate hasn't seen yet
+  if (fresh.length) {
+    const checkUrl = supabaseUrl + "/rest/v1/link_clicks?fingerprint_hash=in.(" + fresh.map(p => p.fingerprint_hash).join(",") + ")&select=fingerprint_hash";
+    try {
+      const res = await fetch(checkUrl, {
+        headers: { apikey: serviceKey, Authorization: "Bearer " + serviceKey }
+      });
+      const existing = new Set((await res.json()).map(row => row.fingerprint_hash));
+      for (const payload of fresh) payload.is_unique = !existing.has(payload.fingerprint_hash);
+    } catch (_) {
+      for (const payload of fresh) payload.is_unique = false;
+    }
+  }
+
+  await insertClicks(supabaseUrl, serviceKey, payloads);
+}''',
+    "rpc": '''async function checkUniqueAndLogBatch(supabaseUrl, serviceKey, payloads) {
+  // Single round trip for the whole batch, log_clicks() runs log_click() per row
+  await fetch(supabaseUrl + "/rest/v1/rpc/log_clicks", {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      apikey: serviceKey,
+      Authorization: "Bearer " + serviceKey,
+    },
+    body: JSON.stringify({ payloads }),
+  }).catch(() => null);
+}''',
+}
+
+LOG_CLICK_DIRECT_JS = '''function logClick(ctx, payload) {
+  ctx.waitUntil(checkUniqueAndLog(SUPABASE_URL, SUPABASE_SERVICE_KEY, payload));
+}'''
+
+
+def log_click_batched_js(check_unique_and_log_batch, batch_size, max_age_ms):
+    """logClick() buffering clicks per isolate, see render_worker_code()"""
+    return f'''{check_unique_and_log_batch}
+
+const CLICK_BATCH_SIZE = {batch_size};
+const CLICK_BATCH_MAX_AGE_MS = {max_age_ms};
+let clickBuffer = [];
+let clickBufferStarted = 0;
+
+function flushClicks() {{
+  if (!clickBuffer.length) return Promise.resolve();
+  const batch = clickBuffer;
+  clickBuffer = [];
+  return checkUniqueAndLogBatch(SUPABASE_URL, SUPABASE_SERVICE_KEY, batch);
+}}
+
+function logClick(ctx, payload) {{
+  clickBuffer.push(payload);
+  if (clickBuffer.length === 1) {{
+    // First click of a batch keeps this request alive until the age limit, then flushes
+    clickBufferStarted = Date.now();
+    ctx.waitUntil(new Promise(resolve => setTimeout(resolve, CLICK_BATCH_MAX_AGE_MS)).then(flushClicks));
+  }}
+  if (clickBuffer.length >= CLICK_BATCH_SIZE || Date.now() - clickBufferStarted >= CLICK_BATCH_MAX_AGE_MS) {{
+    ctx.waitUntil(flushClicks());
+  }}
+}}'''
+
+# Run once in the Supabase SQL editor before deploying workers with WORKER_CLICK_DEDUP=rpc.
+# PostgREST exposes every function in public, so only the service key the workers use may call these
+SUPABASE_LOG_CLICK_SQL = """
+create table if not exists click_fingerprints (
+  fingerprint_hash text primary key,
+  first_seen timestamptz not null default now()
+);
+-- No policies: only the service role (which bypasses RLS) reads or writes fingerprints
+alter table click_fingerprints enable row level security;
+
+insert into click_fingerprints (fingerprint_hash, first_seen)
+select fingerprint_hash, min("timestamp") from link_clicks
+where fingerprint_hash is not null
+group by fingerprint_hash
+on conflict do nothing;
+
+create or replace function log_click(payload jsonb) returns boolean
+language plpgsql set search_path = public as $$
+declare
+  is_new boolean;
+begin
+  insert into click_fingerprints (fingerprint_hash) values (payload->>'fingerprint_hash')
+  on conflict do nothing;
+  is_new := found;
+
+  insert into link_clicks (
+    acc, country, "timestamp", user_agent, model, of_account, tiktok_account, redirected_to,
+    device_type, browser, os, city, region, postal_code, latitude, longitude, timezone,
+    asn, isp, colo, tls_version, referer, accept_language, ip_hash, fingerprint_hash, is_unique
+  )
+  select
+    acc, country, "timestamp", user_agent, model, of_account, tiktok_account, redirected_to,
+    device_type, browser, os, city, region, postal_code, latitude, longitude, timezone,
+    asn, isp, colo, tls_version, referer, accept_language, ip_hash, fingerprint_hash, is_new
+  from jsonb_populate_record(null::link_clicks, payload);
+
+  return is_new;
+end;
+$$;
+
+create or replace function log_clicks(payloads jsonb) returns integer
+language plpgsql set search_path = public as $$
+declare
+  payload jsonb;
+  unique_count integer := 0;
+begin
+  for payload in select * from jsonb_array_elements(payloads) loop
+    if log_click(payload) then
+      unique_count := unique_count + 1;
+    end if;
+  end loop;
+  return unique_count;
+end;
+$$;
+
+revoke execute on function log_click(jsonb) from public, anon, authenticated;
+revoke execute on function log_clicks(jsonb) from public, anon, authenticated;
+grant execute on function log_click(jsonb) to service_role;
+grant execute on function log_clicks(jsonb) to service_role;
+"""
+
+
+def single_route_js(model_name, of_url_us, of_url_de):
+    """resolveRoute(url) -> { model, us, de } always resolving to one creator"""
     return f'''const MODEL_NAME = "{model_name}";
 const REDIRECT_URL_US = "{of_url_us}";
-const REDIRECT_URL_DE = "{of_url_de or of_url_us}";
+const REDIRECT_URL_DE = "{of_url_de}";
+const ROUTE = {{ model: MODEL_NAME, us: REDIRECT_URL_US, de: REDIRECT_URL_DE }};
+
+function resolveRoute(url) {{
+  return ROUTE;
+}}'''
+
+
+def multi_tenant_routes_js(routes):
+    """resolveRoute(url) -> { model, us, de } for the creator a request is for, or null"""
+    return f'''// creator -> [redirect US, redirect DE]
+const ROUTES = {routes};
+
+function resolveRoute(url) {{
+  // Creator from the hostname (custom domains), else the first path segment
+  const host = url.hostname.split(".")[0].toLowerCase();
+  const segment = (url.pathname.split("/")[1] || "").toLowerCase();
+  for (const model of [host, segment]) {{
+    if (Object.hasOwn(ROUTES, model)) {{
+      return {{ model, us: ROUTES[model][0], de: ROUTES[model][1] }};
+    }}
+  }}
+  return null;
+}}'''
+
+
+def worker_js(routing, check_unique_and_log, log_click):
+    """The whole worker script around a resolveRoute() block"""
+    return f'''{routing}
 
 // Hardcoded credentials (env bindings don't work reliably)
 const SUPABASE_URL = "https://utzkvosladgdsbpujozu.supabase.co";
@@ -85,11 +1231,11 @@ function parseDevice(userAgent) {{
   return {{ device_type: isMobile ? "mobile" : "desktop", os, browser }};
 }}
 
-function pickTarget(country) {{
+function pickTarget(route, country) {{
   const isDach = DACH_COUNTRIES.has(country);
   return isDach
-    ? {{ of_account: MODEL_NAME + "_de", redirected_to: REDIRECT_URL_DE }}
-    : {{ of_account: MODEL_NAME + "_us", redirected_to: REDIRECT_URL_US }};
+    ? {{ of_account: route.model + "_de", redirected_to: route.de }}
+    : {{ of_account: route.model + "_us", redirected_to: route.us }};
 }}
 
 async function sha256(str) {{
@@ -97,20 +1243,25 @@ async function sha256(str) {{
   return Array.from(new Uint8Array(buf)).map(b => b.toString(16).padStart(2, "0")).join("").slice(0, 32);
 }}
 
-async function checkUniqueAndLog(supabaseUrl, serviceKey, payload) {{
-  // Check if fingerprint has been seen before
-  const checkUrl = supabaseUrl + "/rest/v1/link_clicks?fingerprint_hash=eq." + payload.fingerprint_hash + "&select=id&limit=1";
-  try {{
-    const res = await fetch(checkUrl, {{
-      headers: {{ apikey: serviceKey, Authorization: "Bearer " + serviceKey }}
-    }});
-    const existing = await res.json();
-    payload.is_unique = existing.length === 0;
-  }} catch (_) {{
-    payload.is_unique = false;
+// Fingerprints this isolate has already logged (LRU): repeat clicks skip the lookup
+const SEEN_FINGERPRINTS = new Map();
+const SEEN_FINGERPRINTS_MAX = 5000;
+
+function rememberFingerprint(hash) {{
+  if (SEEN_FINGERPRINTS.has(hash)) {{
+    SEEN_FINGERPRINTS.delete(hash);
+    SEEN_FINGERPRINTS.set(hash, true);
+    return true;
   }}
+  SEEN_FINGERPRINTS.set(hash, true);
+  if (SEEN_FINGERPRINTS.size > SEEN_FINGERPRINTS_MAX) {{
+    SEEN_FINGERPRINTS.delete(SEEN_FINGERPRINTS.keys().next().value);
+  }}
+  return false;
+}}
 
-  // Insert click
+// Accepts one click or an array of clicks (multi-row insert)
+async function insertClicks(supabaseUrl, serviceKey, rows) {{
   await fetch(supabaseUrl + "/rest/v1/link_clicks", {{
     method: "POST",
     headers: {{
@@ -119,10 +1270,14 @@ async function checkUniqueAndLog(supabaseUrl, serviceKey, payload) {{
       Authorization: "Bearer " + serviceKey,
       Prefer: "return=minimal",
     }},
-    body: JSON.stringify(payload),
+    body: JSON.stringify(rows),
   }}).catch(() => null);
 }}
 
+{check_unique_and_log}
+
+{log_click}
+
 export default {{
   async fetch(request, env, ctx) {{
     const url = new URL(request.url);
@@ -133,10 +1288,15 @@ export default {{
       return new Response("Nothing here", {{ status: 200 }});
     }}
 
+    const route = resolveRoute(url);
+    if (!route) {{
+      return new Response("Nothing here", {{ status: 404 }});
+    }}
+
     const country = cf.country || "US";
     const isDach = DACH_COUNTRIES.has(country);
     const acc = (url.searchParams.get("acc") || "unknown").slice(0, 100);
-    const target = pickTarget(country);
+    const target = pickTarget(route, country);
     const device = parseDevice(ua);
 
     const ip = request.headers.get("CF-Connecting-IP") || "";
@@ -153,7 +1313,7 @@ export default {{
       country,
       timestamp: new Date().toISOString(),
       user_agent: ua.slice(0, 500),
-      model: isDach ? MODEL_NAME + "_de" : MODEL_NAME,
+      model: isDach ? route.model + "_de" : route.model,
       of_account: target.of_account,
       tiktok_account: acc,
       redirected_to: target.redirected_to,
@@ -181,14 +1341,98 @@ export default {{
     }};
 
     // Redirect user immediately — logging happens in background
-    ctx.waitUntil(checkUniqueAndLog(SUPABASE_URL, SUPABASE_SERVICE_KEY, payload));
+    logClick(ctx, payload);
     return Response.redirect(target.redirected_to, 302);
   }},
 }};'''
 
 
-def generate_netlify_html(worker_url, tiktok_handle, background_url="background.jpg", gif_url="https://s6.gifyu.com/images/bz27i.gif"):
-    """Generate Netlify landing page HTML - Miriam-style design with floating labels"""
+def render_worker_code(routing, click_dedup, click_batch_size, click_batch_max_age_ms):
+    """Worker code around a resolveRoute() block
+
+    click_dedup picks how clicks are checked for uniqueness, see WORKER_CLICK_DEDUP.
+    With click_batch_size > 1, clicks are buffered per isolate and flushed as one
+    multi-row insert per click_batch_size clicks or click_batch_max_age_ms.
+    """
+    if click_batch_size > 1:
+        log_click = log_click_batched_js(CHECK_UNIQUE_AND_LOG_BATCH_JS[click_dedup], click_batch_size, click_batch_max_age_ms)
+    else:
+        log_click = LOG_CLICK_DIRECT_JS
+
+    return worker_js(routing, CHECK_UNIQUE_AND_LOG_JS[click_dedup], log_click)
+
+
+@functools.lru_cache(maxsize=256)
+def generate_worker_code(model_name, of_url_us, of_url_de, click_dedup=WORKER_CLICK_DEDUP,
+                         click_batch_size=WORKER_CLICK_BATCH_SIZE, click_batch_max_age_ms=WORKER_CLICK_BATCH_MAX_AGE_MS):
+    """Generate Cloudflare Worker code for a creator - with hardcoded credentials (env bindings don't work)"""
+    routing = single_route_js(model_name, of_url_us, of_url_de or of_url_us)
+    return render_worker_code(routing, click_dedup, click_batch_size, click_batch_max_age_ms)
+
+
+def multi_tenant_routes(creators):
+    """Routing table for the multi-tenant worker as hashable (name, of_us, of_de) tuples"""
+    return tuple(sorted(
+        (name, config['of_us'], config.get('of_de') or config['of_us'])
+        for name, config in creators.items() if config.get('of_us')
+    ))
+
+
+def legacy_worker_name(name, config, deployed_hashes):
+    """The creator's own worker script, kept next to MULTI_TENANT_WORKER, or None if it never had one
+
+    That's the worker in its config (miri2, suki2, or recorded by
+    worker_deploy_plan() when it moved) or a {name}2 script uploaded from here
+    (deployed_hashes, see get_deployed_worker_hashes()). Pages deployed
+    before the creator moved still link to it, and a workers.dev host only
+    ever runs its own script, so it keeps getting the creator's latest URLs.
+    """
+    worker_name = (config or {}).get('worker') or f"{name}2"
+    if (config or {}).get('worker') or worker_name in deployed_hashes:
+        return worker_name
+    return None
+
+
+@functools.lru_cache(maxsize=16)
+def generate_multi_tenant_worker_code(routes, click_dedup=WORKER_CLICK_DEDUP,
+                                      click_batch_size=WORKER_CLICK_BATCH_SIZE, click_batch_max_age_ms=WORKER_CLICK_BATCH_MAX_AGE_MS):
+    """Generate the single worker serving every creator in routes (see multi_tenant_routes)
+
+    The routing table is embedded in the script like the credentials, so adding
+    a creator is one upload of this script instead of a new script.
+    """
+    routing = multi_tenant_routes_js(json.dumps({name: [us, de] for name, us, de in routes}, separators=(',', ':')))
+    return render_worker_code(routing, click_dedup, click_batch_size, click_batch_max_age_ms)
+
+
+def responsive_background_css(image):
+    """CSS for an uploaded background: inline placeholder plus width-matched variants
+
+    The blurred placeholder is painted on <html> straight away; <body> then
+    loads the smallest variant at least twice the viewport's CSS width, as
+    WebP via image-set() with a JPEG fallback.
+    """
+    rules = [f"html{{background:#111 url('{image.placeholder}') no-repeat center center / cover;}}"]
+    previous_width = None
+    for width, base_path in image.variants:
+        name = base_path.lstrip('/')
+        rule = (
+            f"body{{background-image:url('{name}.jpg');"
+            f"background-image:image-set(url('{name}.webp') type('image/webp'),url('{name}.jpg') type('image/jpeg'));}}"
+        )
+        if previous_width:
+            rule = f"@media (min-width:{previous_width // 2 + 1}px){{{rule}}}"
+        rules.append(rule)
+        previous_width = width
+    return ''.join(rules)
+
+
+def generate_netlify_html(worker_url, tiktok_handle, background_url="background.jpg", gif_url="https://s6.gifyu.com/images/bz27i.gif", image=None):
+    """Generate Netlify landing page HTML - Miriam-style design with floating labels
+
+    Pass the uploaded BackgroundImage as image to use its responsive variants.
+    """
+    background_rules = responsive_background_css(image) if image else ''
     return f'''<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -201,7 +1445,7 @@ def generate_netlify_html(worker_url, tiktok_handle, background_url="background.
   :root{{--fg:#fff;--muted:rgba(255,255,255,.95);--label-bg: rgba(20,20,24,0.62);--label-border: rgba(255,255,255,0.28);--gif-w: clamp(220px, 60vw, 280px);--gif-center: 28%;--num-accent: #00ff66;}}
   *{{ box-sizing:border-box; }}
   html, body{{ height:100vh; overflow:hidden; }}
-  body{{margin:0;background: url('{background_url}') no-repeat center center / cover fixed;color: var(--fg);font-family: Poppins, system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial, sans-serif;}}
+  body{{margin:0;background: url('{background_url}') no-repeat center center / cover fixed;color: var(--fg);font-family: Poppins, system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial, sans-serif;}}{background_rules}
   .gif-card{{position: fixed;left: 50%;top: var(--gif-center);transform: translate(-50%, -50%);width: var(--gif-w);height: auto;border-radius: 16px;box-shadow: 0 8px 24px rgba(0,0,0,.45);z-index: 3;background: rgba(0,0,0,.15);-webkit-backdrop-filter: blur(6px);backdrop-filter: blur(6px);border: 1px solid rgba(255,255,255,.18);padding: 10px;}}
   .gif-card img, .gif-card video{{width:100%; height:auto; display:block;border-radius:12px; background:#111;}}
   .corner-label, .below{{position: fixed;display: inline-flex;align-items: center;gap: 8px;padding: 10px 14px;border-radius: 999px;background: var(--label-bg);border: 1px solid var(--label-border);-webkit-backdrop-filter: blur(8px);backdrop-filter: blur(8px);box-shadow: 0 6px 22px rgba(0,0,0,.32);color: rgba(255,255,255,0.96);font-weight: 700;font-size: clamp(14px, 2.1vw, 17px);z-index: 5;}}
@@ -237,15 +1481,8 @@ def generate_netlify_html(worker_url, tiktok_handle, background_url="background.
 </html>'''
 
 
-@app.route('/')
-def index():
-    """Render the Link Setup admin panel"""
-    creators_options = ''.join([f'<option value="{name}" data-has-bg="{1 if CREATORS_CONFIG[name].get("background") else 0}">{name.title()}</option>' for name in sorted(CREATORS_CONFIG.keys())])
-
-    # Pass creator config to JavaScript
-    import json
-    creators_json = json.dumps({k: {"background": v.get("background")} for k, v in CREATORS_CONFIG.items()})
-
+def admin_panel_html(creators_options, creators_json):
+    """The admin panel page, see render_admin_panel()"""
     return f'''<!DOCTYPE html>
 <html lang="de">
 <head>
@@ -523,15 +1760,12 @@ def index():
             const file = event.target.files[0];
             if (file) {{
                 selectedFile = file;
-                const reader = new FileReader();
-                reader.onload = function(e) {{
-                    const preview = document.getElementById('preview');
-                    preview.src = e.target.result;
-                    preview.style.display = 'block';
-                    document.getElementById('file-text').textContent = file.name;
-                    document.getElementById('file-label').classList.add('has-file');
-                }};
-                reader.readAsDataURL(file);
+                const preview = document.getElementById('preview');
+                if (preview.src) URL.revokeObjectURL(preview.src);
+                preview.src = URL.createObjectURL(file);
+                preview.style.display = 'block';
+                document.getElementById('file-text').textContent = file.name;
+                document.getElementById('file-label').classList.add('has-file');
             }}
         }}
 
@@ -547,9 +1781,12 @@ def index():
                 return;
             }}
 
-            let backgroundData = null;
+            // Send as multipart so the image goes up as raw bytes, not base64 in JSON
+            const form = new FormData();
+            form.append('creator', creator);
+            form.append('handle', handle);
             if (bgChoice === 'existing') {{
-                backgroundData = {{ type: 'url', url: creatorsConfig[creator].background }};
+                form.append('background_url', creatorsConfig[creator].background);
             }} else {{
                 if (!selectedFile) {{
                     statusEl.className = 'status error';
@@ -562,27 +1799,16 @@ def index():
                     statusEl.innerHTML = `Bild zu gross (${{(selectedFile.size / 1024 / 1024).toFixed(1)}}MB). Max 5MB erlaubt.`;
                     return;
                 }}
-                // Convert file to base64
-                const base64 = await new Promise((resolve, reject) => {{
-                    const reader = new FileReader();
-                    reader.onload = () => resolve(reader.result.split(',')[1]);
-                    reader.onerror = () => reject(new Error('Fehler beim Lesen der Datei'));
-                    reader.readAsDataURL(selectedFile);
-                }});
-                backgroundData = {{ type: 'upload', data: base64, filename: selectedFile.name }};
+                form.append('background', selectedFile, selectedFile.name);
             }}
 
             statusEl.className = 'status loading';
             statusEl.innerHTML = 'Deploying...';
 
             try {{
-                const payload = {{ creator, handle, background: backgroundData }};
-                console.log('Sending payload, size:', JSON.stringify(payload).length, 'bytes');
-
                 const resp = await fetch('/api/deploy-netlify', {{
                     method: 'POST',
-                    headers: {{ 'Content-Type': 'application/json' }},
-                    body: JSON.stringify(payload)
+                    body: form
                 }});
 
                 if (!resp.ok) {{
@@ -664,304 +1890,2605 @@ def index():
 </body>
 </html>'''
 
+# (creators version, html, etag) of the last rendered admin panel
+_admin_panel_cache = None
 
-@app.route('/api/deploy-netlify', methods=['POST'])
-def api_deploy_netlify():
-    """Deploy a Netlify landing page for a TikTok account"""
-    try:
+
+def render_admin_panel():
+    """Render the admin panel, returns (html, etag)
+
+    Cached per gunicorn worker until the creator registry version changes.
+    """
+    global _admin_panel_cache
+    version, creators = creator_registry.load()
+    cached = _admin_panel_cache
+    if cached and cached[0] == version:
+        return cached[1], cached[2]
+
+    creators_options = ''.join([f'<option value="{name}" data-has-bg="{1 if creators[name].get("background") else 0}">{name.title()}</option>' for name in sorted(creators.keys())])
+
+    # Pass creator config to JavaScript
+    creators_json = json.dumps({k: {"background": v.get("background")} for k, v in creators.items()})
+
+    html = admin_panel_html(creators_options, creators_json)
+    etag = hashlib.sha1(html.encode()).hexdigest()
+    _admin_panel_cache = (version, html, etag)
+    return html, etag
+
+
+@app.route('/')
+def index():
+    """Render the Link Setup admin panel (revalidated via ETag, 304 when unchanged)"""
+    html, etag = render_admin_panel()
+    response = Response(html, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+class DeployError(Exception):
+    """A deploy step failed; the message is shown to the VA as-is"""
+
+
+def get_worker_name(creator):
+    """Name of the creator's own worker script"""
+    # Check config for custom names (miri2, suki2), otherwise use pattern {creator}2
+    return (creator_registry.get(creator) or {}).get('worker') or f"{creator}2"
+
+
+def get_worker_url(creator):
+    """Resolve the click-tracking worker URL for a creator"""
+    if MULTI_TENANT_WORKER and (creator_registry.get(creator) or {}).get('multi_tenant'):
+        return f"https://{MULTI_TENANT_WORKER}.signaturenorthwest.workers.dev/{creator}"
+    return f"https://{get_worker_name(creator)}.signaturenorthwest.workers.dev"
+
+
+def normalize_handle(handle):
+    return (handle or '').strip().lower().replace('@', '')
+
+
+SiteFile = namedtuple('SiteFile', ['path', 'data', 'sha1'])
+
+# files: SiteFile list, /background.jpg first. variants: (width, base path) pairs,
+# ascending, each deployed as .jpg and .webp. placeholder: blurred data URI
+BackgroundImage = namedtuple('BackgroundImage', ['files', 'variants', 'placeholder'])
+
+
+class ImageCache:
+    """Content-addressed disk cache of processed background images
+
+    Keyed by the SHA-256 of the raw upload. Each entry is a JSON header line
+    (variants, placeholder, and path/SHA-1/size of every file) followed by
+    the file contents back to back. Lives on disk so all gunicorn workers
+    share it; file mtime is the LRU clock.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                files = [SiteFile(file_path, f.read(size), sha1) for file_path, sha1, size in header['files']]
+            os.utime(path)  # mark as recently used
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+        if not files or any(len(file.data) != size for file, (_, _, size) in zip(files, header['files'])):
+            return None  # truncated entry
+        variants = [tuple(variant) for variant in header['variants']]
+        return BackgroundImage(files, variants, header['placeholder'])
+
+    def put(self, key, image):
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Write to a temp file and rename, so other workers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                header = {
+                    'variants': image.variants,
+                    'placeholder': image.placeholder,
+                    'files': [(file.path, file.sha1, len(file.data)) for file in image.files],
+                }
+                f.write(json.dumps(header).encode() + b'\n')
+                for file in image.files:
+                    f.write(file.data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.bin'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # another worker evicted it first
+            total -= size
+
+
+image_cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)
+
+
+def encode_image(img, image_format, **options):
+    output_buffer = BytesIO()
+    img.save(output_buffer, format=image_format, **options)
+    return output_buffer.getvalue()
+
+
+def compress_background_image(raw_image_data):
+    """Compress and resize an uploaded background image, returns a BackgroundImage
+
+    Emits the full-size JPEG (max 1920px wide, as before) and WebP, smaller
+    JPEG/WebP variants for narrower screens and an inline blurred placeholder.
+    Runs inside the image process pool, see run_image_job().
+    """
+    img = Image.open(BytesIO(raw_image_data))
+
+    # Only the header has been read so far - refuse decompression bombs before decoding
+    if img.width * img.height > IMAGE_MAX_PIXELS:
+        raise ValueError(f'Image too large ({img.width}x{img.height}), max {IMAGE_MAX_PIXELS} pixels')
+
+    max_width = BACKGROUND_MAX_WIDTH
+
+    # Let the JPEG decoder scale down by 1/2, 1/4 or 1/8 while decoding
+    if img.format == 'JPEG' and img.width > max_width:
+        img.draft('RGB', (max_width, int(img.height * max_width / img.width)))
+
+    # Convert to RGB if necessary (transparency, palettes, bilevel, CMYK, 16/32-bit...),
+    # the reduce/resize/blur steps and the encoders below only take RGB and L
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    # Cheap integer box reduction while still at least twice the target width
+    factor = img.width // max_width
+    if factor >= 2:
+        img = img.reduce(factor)
+
+    # Resize if width exceeds 1920px (maintain aspect ratio)
+    if img.width > max_width:
+        ratio = max_width / img.width
+        new_height = int(img.height * ratio)
+        img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+
+    # Save as JPEG with 85% quality
+    outputs = [
+        ('/background.jpg', encode_image(img, 'JPEG', quality=85, optimize=True)),
+        ('/background.webp', encode_image(img, 'WEBP', quality=80, method=4)),
+    ]
+    variants = []
+
+    for width in BACKGROUND_VARIANT_WIDTHS:
+        if width >= img.width:
+            break
+        variant = img.resize((width, round(img.height * width / img.width)), Image.Resampling.LANCZOS)
+        outputs.append((f'/bg-{width}.jpg', encode_image(variant, 'JPEG', quality=80, optimize=True, progressive=True)))
+        outputs.append((f'/bg-{width}.webp', encode_image(variant, 'WEBP', quality=78, method=4)))
+        variants.append((width, f'/bg-{width}'))
+    variants.append((img.width, '/background'))
+
+    # Tiny, pre-blurred placeholder, upscaled by the browser until the real image arrives
+    placeholder_height = max(1, round(img.height * BACKGROUND_PLACEHOLDER_WIDTH / img.width))
+    placeholder = img.resize((BACKGROUND_PLACEHOLDER_WIDTH, placeholder_height), Image.Resampling.BILINEAR)
+    placeholder = placeholder.filter(ImageFilter.GaussianBlur(1))
+    placeholder_data = encode_image(placeholder, 'JPEG', quality=50)
+
+    files = [SiteFile(path, data, hashlib.sha1(data).hexdigest()) for path, data in outputs]
+    return BackgroundImage(files, variants, f"data:image/jpeg;base64,{base64.b64encode(placeholder_data).decode()}")
+
+
+def background_image_stats(image):
+    """Byte sizes of an uploaded background, and what a phone saves against the full JPEG
+
+    A typical phone (~390 CSS px, 2x DPR) loads the WebP of the smallest
+    variant at least 780px wide, see responsive_background_css().
+    """
+    sizes = {file.path: len(file.data) for file in image.files}
+    mobile_base = next((base for width, base in image.variants if width >= 780), image.variants[-1][1])
+    mobile_bytes = sizes[f'{mobile_base}.webp']
+    return {
+        'background_bytes': sizes,
+        'mobile_background_bytes': mobile_bytes,
+        'background_bytes_saved': sizes['/background.jpg'] - mobile_bytes,
+    }
+
+
+def _process_image_job(raw_image_data, submitted_at):
+    """Process pool entry point, returns (BackgroundImage, queue_seconds, processing_seconds)"""
+    started_at = time.time()
+    image = compress_background_image(raw_image_data)
+    return image, started_at - submitted_at, time.time() - started_at
+
+
+_image_pool = None
+_image_pool_lock = threading.Lock()
+_image_queue_slots = threading.BoundedSemaphore(IMAGE_QUEUE_SIZE)
+
+
+def get_image_pool():
+    """Lazily start this worker's image process pool (after gunicorn forked us)"""
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is None:
+            _image_pool = ProcessPoolExecutor(
+                max_workers=IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _image_pool
+
+
+def run_image_job(raw_image_data):
+    """Compress an image in the process pool, returns (BackgroundImage, timings)
+
+    At most IMAGE_QUEUE_SIZE jobs may be queued or running per web worker;
+    further requests wait for a slot and give up after IMAGE_QUEUE_TIMEOUT.
+    """
+    global _image_pool
+    submitted_at = time.time()
+    if not _image_queue_slots.acquire(timeout=IMAGE_QUEUE_TIMEOUT):
+        raise DeployError('Image processing is busy, please try again')
+
+    try:
+        future = get_image_pool().submit(_process_image_job, raw_image_data, submitted_at)
+        image, queue_seconds, processing_seconds = future.result()
+    except BrokenProcessPool:
+        # A child died (e.g. killed for memory) - start a fresh pool next time
+        with _image_pool_lock:
+            _image_pool = None
+        raise DeployError('Image processing failed, please try again')
+    finally:
+        _image_queue_slots.release()
+
+    metrics.observe('stage_seconds', queue_seconds, stage='image_queue')
+    metrics.observe('stage_seconds', processing_seconds, stage='image_processing')
+    return image, {
+        'image_queue_ms': round(queue_seconds * 1000),
+        'image_processing_ms': round(processing_seconds * 1000),
+    }
+
+
+def process_background_upload(image_file, image_stats=None):
+    """Return the processed BackgroundImage for a seekable upload stream, via the image cache
+
+    If an image_stats dict is passed, processing times and byte sizes are added to it.
+    """
+    # Hash in chunks so the upload is never held in memory as one extra copy
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: image_file.read(64 * 1024), b''):
+        sha256.update(chunk)
+    cache_key = f"{sha256.hexdigest()}-v{IMAGE_PIPELINE_VERSION}"
+
+    image = image_cache.get(cache_key)
+    if not image:
+        image_file.seek(0)
+        image, timings = run_image_job(image_file.read())
+        if image_stats is not None:
+            image_stats.update(timings)
+        try:
+            image_cache.put(cache_key, image)
+        except OSError:
+            pass  # cache is best-effort, the deploy can go ahead without it
+
+    if image_stats is not None:
+        image_stats.update(background_image_stats(image))
+    return image
+
+
+def decode_background_data(background):
+    """Stream over the base64 `data` of a JSON background upload"""
+    with metrics.time('stage_seconds', stage='base64_decode'):
+        return BytesIO(base64.b64decode(background.get('data', '')))
+
+
+def prepare_background(background, image_stats=None, creator=None):
+    """Turn a background payload into (background_url, image)
+
+    image is a BackgroundImage, or None when the page points at an external URL.
+    Image processing times and sizes are added to the image_stats dict, if passed.
+    With a creator, uploads are hosted on the creator's asset site (see
+    host_creator_background) and image only carries links to it, unless that
+    fails and the files go out with the page as without a creator.
+    """
+    bg_type = background.get('type')
+
+    if bg_type == 'url':
+        # Use external URL, with its responsive variants if it's one of our hosted backgrounds
+        url = background.get('url', '')
+        return url, hosted_background(url)
+    elif bg_type == 'upload':
+        # Use uploaded image - compress and resize before deploying.
+        # Multipart uploads hand over the request's file stream, JSON ones base64 data
+        image_file = background.get('file') or decode_background_data(background)
+        image = process_background_upload(image_file, image_stats)
+        if creator:
+            try:
+                return host_creator_background(creator, image)
+            except Exception as e:
+                # Ship the files with the page instead, it only costs the sharing between handles
+                if image_stats is not None:
+                    image_stats['asset_site_error'] = str(e)
+        return 'background.jpg', image
+
+    raise DeployError('Invalid background type')
+
+
+def known_netlify_digests(digests):
+    """Return the subset of SHA-1 digests Netlify has already accepted from us"""
+    if not digests:
+        return set()
+    try:
+        with db_connect() as conn:
+            rows = conn.execute(
+                f"SELECT sha1 FROM netlify_digests WHERE sha1 IN ({','.join('?' * len(digests))})",
+                list(digests)
+            ).fetchall()
+    except sqlite3.Error:
+        return set()  # no index means every file counts as unknown
+    return {row['sha1'] for row in rows}
+
+
+def remember_netlify_digests(files):
+    """Record the digests of files in a deploy that went ready"""
+    try:
+        with db_connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO netlify_digests (sha1, size, accepted_at) VALUES (?, ?, ?)",
+                [(sha1, len(data), time.time()) for _, data, sha1 in files]
+            )
+    except sqlite3.Error:
+        pass
+
+
+class NetlifySite:
+    """A Netlify site deployed from here, its site_id kept in one of the local index tables
+
+    handle_sites (tt-{handle}), asset_sites (assets-{creator}) and
+    creator_sites (links-{creator}) all map one key column to a site_id.
+    """
+
+    def __init__(self, name, table, key_column, key):
+        self.name = name
+        self.table = table
+        self.key_column = key_column
+        self.key = key
+
+    def indexed_id(self):
+        """site_id from the index, or None"""
+        try:
+            with db_connect() as conn:
+                row = conn.execute(
+                    f"SELECT site_id FROM {self.table} WHERE {self.key_column} = ?", (self.key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        return row['site_id'] if row else None
+
+    def index(self, site_id):
+        """Record (or correct) the site_id"""
+        try:
+            with db_connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} ({self.key_column}, site_id) VALUES (?, ?)", (self.key, site_id)
+                )
+        except sqlite3.Error:
+            pass  # the next deploy resolves it through Netlify again
+
+
+def handle_site(handle):
+    """The handle's own tt-{handle} site"""
+    return NetlifySite(f"tt-{handle}", 'handle_sites', 'handle', handle)
+
+
+def asset_site(creator):
+    """The creator's {NETLIFY_ASSET_SITE_PREFIX}{creator} site hosting uploaded backgrounds"""
+    return NetlifySite(f"{NETLIFY_ASSET_SITE_PREFIX}{creator}", 'asset_sites', 'creator', creator)
+
+
+def creator_site(creator):
+    """The creator's consolidated {NETLIFY_CREATOR_SITE_PREFIX}{creator} site"""
+    return NetlifySite(f"{NETLIFY_CREATOR_SITE_PREFIX}{creator}", 'creator_sites', 'creator', creator)
+
+
+def indexed_site_id(handle):
+    """site_id of the handle's own tt-{handle} Netlify site from the index, or None"""
+    return handle_site(handle).indexed_id()
+
+
+def index_site(handle, site_id):
+    """Record (or correct) the site_id of a handle's own tt-{handle} site"""
+    handle_site(handle).index(site_id)
+
+
+def serving_site_id(handle):
+    """site_id of the site the handle's page was last deployed to, or None"""
+    try:
+        with db_connect() as conn:
+            row = conn.execute("SELECT site_id FROM deployments WHERE handle = ?", (handle,)).fetchone()
+    except sqlite3.Error:
+        return None
+    return row['site_id'] if row else None
+
+
+def index_deployment(creator, handle, site_id, deploy_id, files_manifest):
+    """Record a deploy that went ready: the site now serving the page, deploy_id and file digests"""
+    try:
+        with db_connect() as conn:
+            now = time.time()
+            conn.execute(
+                "INSERT INTO deployments (handle, creator, site_id, deploy_id, files, created_at, deployed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (handle) DO UPDATE SET creator = excluded.creator, site_id = excluded.site_id, "
+                "deploy_id = excluded.deploy_id, files = excluded.files, deployed_at = excluded.deployed_at",
+                (handle, creator, site_id, deploy_id, json.dumps(files_manifest), now, now)
+            )
+    except sqlite3.Error:
+        pass
+
+
+def record_page_source(handle, background_url, image=None):
+    """Remember what a handle's page was rendered from, so redeploy-all-pages can render it again"""
+    try:
+        with db_connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_sources (handle, background_url, variants, placeholder) VALUES (?, ?, ?, ?)",
+                (handle, background_url, json.dumps(image.variants) if image else None, image.placeholder if image else None)
+            )
+    except sqlite3.Error:
+        pass  # the page just can't be redeployed in bulk until its next deploy
+
+
+def create_netlify_site(site_name):
+    """Create a Netlify site, or look up its id if the name is already taken"""
+    return run_blocking(create_netlify_site_io(blocking_io, site_name))
+
+
+async def create_netlify_site_io(io, site_name):
+    """create_netlify_site() over io (blocking_io or event_loop_io)"""
+    create_resp = await io.netlify.post("/sites", json={"name": site_name})
+
+    if create_resp.status_code not in [200, 201]:
+        sites_resp = await io.netlify.get("/sites", params={"name": site_name})
+        # the name filter matches substrings, so my-tt-anna comes back for tt-anna too
+        sites = sites_resp.json() if sites_resp.status_code == 200 else []
+        site_id = next((site['id'] for site in sites if site.get('name') == site_name), None)
+        if site_id:
+            return site_id
+        raise DeployError(f'Failed to create site: {create_resp.text}')
+    return create_resp.json()['id']
+
+
+def upload_netlify_files(deploy_id, files, on_uploaded=None):
+    """PUT each (path, data, sha1) file into a deploy, calling on_uploaded(path) after each"""
+    run_blocking(upload_netlify_files_io(blocking_io, deploy_id, files, on_uploaded))
+
+
+async def upload_netlify_files_io(io, deploy_id, files, on_uploaded=None):
+    """upload_netlify_files() over io, which sends the PUTs together in the ASGI mode (still rate limited)"""
+    async def upload(file_path, file_data):
+        upload_resp = await io.netlify.put(
+            f"/deploys/{deploy_id}/files{file_path}",
+            headers={"Content-Type": "application/octet-stream"},
+            data=file_data
+        )
+
+        # Handle upload response - 422 "no records matched" means file is already in cache
+        if upload_resp.status_code == 422:
+            # File already exists in Netlify cache - this is OK, continue
+            pass
+        elif upload_resp.status_code not in [200, 201]:
+            raise DeployError(f'Failed to upload {file_path}: {upload_resp.text}')
+
+        if on_uploaded:
+            await io.blocking(on_uploaded, file_path)
+
+    await io.gather(*(upload(file_path, file_data) for file_path, file_data, _ in files))
+
+
+def wait_for_netlify_deploy(deploy_id, timeout=NETLIFY_READY_TIMEOUT):
+    """Poll a deploy until it is ready (True) or errors/times out (False)"""
+    return run_blocking(wait_for_netlify_deploy_io(blocking_io, deploy_id, timeout))
+
+
+async def wait_for_netlify_deploy_io(io, deploy_id, timeout=NETLIFY_READY_TIMEOUT):
+    """wait_for_netlify_deploy() over io"""
+    deadline = time.monotonic() + timeout
+    while True:
+        resp = await io.netlify.get(f"/deploys/{deploy_id}")
+        state = resp.json().get('state') if resp.status_code == 200 else None
+        if state == 'ready':
+            return True
+        if state == 'error' or time.monotonic() >= deadline:
+            return False
+        await io.sleep(NETLIFY_READY_POLL_INTERVAL)
+
+
+class KeyedLocks:
+    """A lock per key (e.g. per creator), so unrelated keys don't wait on each other"""
+
+    def __init__(self):
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+
+# Held while a creator's asset site is deployed, so two uploads for the same creator
+# don't each send a manifest missing the other's background
+_asset_site_locks = KeyedLocks()
+
+
+def hosted_background(url):
+    """BackgroundImage linking to a background on an asset site, or None if url isn't one"""
+    try:
+        with db_connect() as conn:
+            row = conn.execute("SELECT variants, placeholder FROM asset_images WHERE url = ?", (url,)).fetchone()
+    except sqlite3.Error:
+        return None
+    if not row:
+        return None
+    return BackgroundImage([], [tuple(variant) for variant in json.loads(row['variants'])], row['placeholder'])
+
+
+def netlify_site_files(site_id):
+    """path -> SHA-1 of every file in a site's current deploy on Netlify, {} for no site"""
+    if site_id is None:
+        return {}
+    resp = netlify_api.get(f"/sites/{site_id}/files")
+    if resp.status_code == 404:
+        return {}
+    if resp.status_code != 200:
+        # Deploying without them would take the files off the site
+        raise DeployError(f'Failed to list site files: {resp.text}')
+    return {f['path']: f['sha'] for f in resp.json()}
+
+
+def asset_site_manifest(creator):
+    """path -> SHA-1 of every file hosted on the creator's asset site"""
+    with db_connect() as conn:
+        rows = conn.execute("SELECT files FROM asset_images WHERE creator = ?", (creator,)).fetchall()
+    if not rows:
+        # Nothing recorded here (a new database, or another host's) doesn't mean nothing
+        # is hosted, ask Netlify what the site has
+        site = asset_site(creator)
+        return netlify_site_files(site.indexed_id() or find_netlify_site(site.name))
+    manifest = {}
+    for row in rows:
+        manifest.update(json.loads(row['files']))
+    return manifest
+
+
+def host_creator_background(creator, image):
+    """Publish a processed background on the creator's asset site, returns (background_url, image)
+
+    Files go under a directory named by the content hash of the whole set and
+    the site keeps every earlier background, so pages deployed against an
+    older upload keep working. The returned image carries no files, only
+    links, and the creator's default background is set to the new upload.
+    """
+    site = asset_site(creator)
+    content_hash = hashlib.sha1(''.join(f.sha1 for f in image.files).encode()).hexdigest()[:16]
+    base_url = f"https://{site.name}.netlify.app/{content_hash}"
+    background_url = f"{base_url}/background.jpg"
+    hosted = BackgroundImage([], [(width, f"{base_url}{path}") for width, path in image.variants], image.placeholder)
+
+    if hosted_background(background_url) is None:
+        files = [SiteFile(f"/{content_hash}{f.path}", f.data, f.sha1) for f in image.files]
+        with _asset_site_locks(creator):
+            deployed = publish_asset_files(site, files)
+            with db_connect() as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO asset_images (url, creator, files, variants, placeholder, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (background_url, creator, json.dumps({f.path: f.sha1 for f in files}),
+                     json.dumps(hosted.variants), hosted.placeholder, time.time())
+                )
+            # Another gunicorn worker may have deployed a background in the meantime without ours,
+            # deploy once more with everything (Netlify has all the files by now)
+            if set(asset_site_manifest(creator)) - set(deployed):
+                publish_asset_files(site, [])
+
+    config = creator_registry.get(creator)
+    if config is not None and config.get('background') != background_url:
+        creator_registry.update(creator, {'background': background_url})
+
+    return background_url, hosted
+
+
+def publish_asset_files(site, files):
+    """Deploy an asset site with everything it hosts plus files, returns the manifest
+
+    Goes through deploy_netlify_files(), so a failed upload resumes on retry
+    and the first background on a new site can go up as one ZIP.
+    """
+    return deploy_netlify_files(site, files, carried=asset_site_manifest(site.key))['files']
+
+
+def report_step(progress, step):
+    """Tell an optional progress callback (see DeployJob) that a step started"""
+    if progress:
+        progress(step)
+
+
+def report_count(progress, completed, total):
+    """Tell an optional progress callback how many items of the running step are done"""
+    if progress:
+        progress.count(completed, total)
+
+
+class DeployProgress:
+    """Completed steps of a multi-step deploy, persisted under an idempotency key
+
+    Keys are derived from what is being deployed, so a retry of the same deploy
+    (same request, bulk rerun or job) picks up the record of the failed attempt
+    and resumes after its last completed step. The record is dropped once the
+    deploy succeeds.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.state = {}
+        try:
+            with db_connect() as conn:
+                row = conn.execute(
+                    "SELECT state FROM deploy_progress WHERE key = ? AND updated_at > ?",
+                    (key, time.time() - DEPLOY_RESUME_MAX_AGE)
+                ).fetchone()
+        except sqlite3.Error:
+            row = None
+        if row:
+            self.state = json.loads(row['state'])
+        self.resumed = bool(self.state)
+
+    def done(self, step):
+        return step in self.state.get('steps', [])
+
+    def complete(self, step, **values):
+        """Record a finished step, plus any values a resumed attempt needs"""
+        self.state.setdefault('steps', []).append(step)
+        self.state.update(values)
+        self._save()
+
+    def file_uploaded(self, path):
+        self.state.setdefault('uploaded', []).append(path)
+        self._save()
+
+    def reset(self):
+        self.state = {}
+        self.resumed = False
+
+    def finish(self):
+        try:
+            with db_connect() as conn:
+                conn.execute("DELETE FROM deploy_progress WHERE key = ?", (self.key,))
+        except sqlite3.Error:
+            pass  # expires after DEPLOY_RESUME_MAX_AGE
+
+    def _save(self):
+        try:
+            with db_connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO deploy_progress (key, state, updated_at) VALUES (?, ?, ?)",
+                    (self.key, json.dumps(self.state), time.time())
+                )
+        except sqlite3.Error:
+            pass  # a retry then redoes this step
+
+
+# Deploy states in which an earlier attempt's deploy can still take its files
+RESUMABLE_DEPLOY_STATES = ('new', 'pending_review', 'prepared', 'uploading', 'uploaded', 'processing', 'ready')
+
+
+async def netlify_deploy_resumable_io(io, deploy_id):
+    """Whether a deploy opened by an earlier attempt can still take its files"""
+    resp = await io.netlify.get(f"/deploys/{deploy_id}")
+    if resp.status_code != 200:
+        return False
+    return resp.json().get('state') in RESUMABLE_DEPLOY_STATES
+
+
+def choose_netlify_deploy_mode(files, known_digests):
+    """'zip' or 'digest' for deploying files, see NETLIFY_DEPLOY_MODE"""
+    if NETLIFY_DEPLOY_MODE in ('zip', 'digest'):
+        return NETLIFY_DEPLOY_MODE
+
+    # Digest mode costs a round trip per missing file, zip mode resends every file
+    missing = [f for f in files if f.sha1 not in known_digests]
+    total_bytes = sum(len(f.data) for f in files)
+    missing_bytes = sum(len(f.data) for f in missing)
+    if (len(missing) >= NETLIFY_ZIP_MIN_FILES and total_bytes <= NETLIFY_ZIP_MAX_BYTES
+            and missing_bytes >= NETLIFY_ZIP_MIN_MISSING_SHARE * total_bytes):
+        return 'zip'
+    return 'digest'
+
+
+def build_site_zip(files):
+    """ZIP archive of a site's files, images stored as-is since they're already compressed"""
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, 'w') as archive:
+        for file_path, file_data, _ in files:
+            compress = zipfile.ZIP_DEFLATED if file_path.endswith(('.html', '.css', '.js')) else zipfile.ZIP_STORED
+            archive.writestr(file_path.lstrip('/'), file_data, compress_type=compress)
+    return buf.getvalue()
+
+
+async def create_netlify_deploy_io(io, site, progress=None, **kwargs):
+    """Resolve a NetlifySite and POST a deploy to it, returns (site_id, response)
+
+    kwargs are the request body: a file manifest (json=) or a site ZIP (data=).
+    """
+    # Look the site up in its index, create it (or get existing) otherwise
+    report_step(progress, 'create_site')
+    site_id = await io.blocking(site.indexed_id)
+    indexed = site_id is not None
+    if not indexed:
+        site_id = await create_netlify_site_io(io, site.name)
+        await io.blocking(site.index, site_id)
+
+    report_step(progress, 'create_deploy')
+    deploy_resp = await io.netlify.post(f"/sites/{site_id}/deploys", **kwargs)
+
+    if deploy_resp.status_code == 404 and indexed:
+        # The indexed site was deleted on Netlify since, start over with a new one
+        site_id = await create_netlify_site_io(io, site.name)
+        await io.blocking(site.index, site_id)
+        deploy_resp = await io.netlify.post(f"/sites/{site_id}/deploys", **kwargs)
+
+    if deploy_resp.status_code not in [200, 201]:
+        raise DeployError(f'Failed to create deploy: {deploy_resp.text}')
+    return site_id, deploy_resp
+
+
+def netlify_page_files(handle, html_content, image=None):
+    """SiteFiles of a tt-{handle} site: its index.html plus the background, if it ships one"""
+    html_data = html_content.encode()
+    files = [SiteFile('/index.html', html_data, hashlib.sha1(html_data).hexdigest())]
+    if image:
+        files.extend(image.files)
+    return files
+
+
+def netlify_deploy_progress(site_name, files_manifest):
+    """DeployProgress of deploying exactly files_manifest to a site"""
+    manifest_hash = hashlib.sha1(json.dumps(files_manifest, sort_keys=True).encode()).hexdigest()
+    return DeployProgress(f"netlify:{site_name}:{manifest_hash}")
+
+
+def deploy_netlify_site(handle, html_content, image=None, progress=None):
+    """Create (or reuse) the tt-{handle} site and deploy its page, see deploy_netlify_files()"""
+    return deploy_netlify_files(handle_site(handle), netlify_page_files(handle, html_content, image), progress=progress)
+
+
+def deploy_netlify_files(site, files, carried=None, progress=None):
+    """Deploy files to a NetlifySite, keeping carried (path -> SHA-1) files already on it, see deploy_netlify_files_io()"""
+    return run_blocking(deploy_netlify_files_io(blocking_io, site, files, carried, progress))
+
+
+async def deploy_netlify_files_io(io, site, files, carried=None, progress=None):
+    """deploy_netlify_files() over io (blocking_io or event_loop_io)
+
+    In digest mode only files Netlify lists as required, or whose digest is
+    not in the local index yet, are uploaded. If the deploy then doesn't go
+    ready, every file is uploaded again as a fallback. A retry after a failure
+    resumes the earlier attempt's deploy and skips the files it already
+    uploaded. In zip mode the whole site goes up in the deploy request itself,
+    see choose_netlify_deploy_mode(). A ZIP replaces every file on the site,
+    so deploys carrying files over always use digest mode.
+    """
+    calls_before = io.netlify.calls_sent()
+    carried = carried or {}
+
+    files_manifest = {**carried, **{file_path: sha1 for file_path, _, sha1 in files}}
+    resume = await io.blocking(netlify_deploy_progress, site.name, files_manifest)
+    known_digests = await io.blocking(known_netlify_digests, {sha1 for _, _, sha1 in files})
+    if resume.done('create_deploy') and not await netlify_deploy_resumable_io(io, resume.state['deploy_id']):
+        resume.reset()
+
+    if resume.done('create_deploy') or carried:
+        mode = 'digest'
+    else:
+        mode = choose_netlify_deploy_mode(files, known_digests)
+
+    if mode == 'zip':
+        # One request carries every file, nothing is left to upload afterwards
+        site_id, deploy_resp = await create_netlify_deploy_io(
+            io, site, progress,
+            data=build_site_zip(files),
+            headers={"Content-Type": "application/zip"}
+        )
+        deploy_id = deploy_resp.json()['id']
+
+        report_step(progress, 'wait_ready')
+        if not await wait_for_netlify_deploy_io(io, deploy_id):
+            raise DeployError(f'Deploy {deploy_id} did not become ready')
+
+        await io.blocking(remember_netlify_digests, files)
+        return {
+            'site_id': site_id,
+            'deploy_id': deploy_id,
+            'deploy_mode': mode,
+            'round_trips': io.netlify.calls_sent() - calls_before,
+            'uploaded_files': list(files_manifest),
+            'forced_upload': False,
+            'resumed': False,
+            'files': files_manifest,
+        }
+
+    if resume.done('create_deploy'):
+        site_id, deploy_id = resume.state['site_id'], resume.state['deploy_id']
+        required_digests = set(resume.state['required'])
+    else:
+        # Steps 1-2: Create deploy with file manifest
+        site_id, deploy_resp = await create_netlify_deploy_io(io, site, progress, json={"files": files_manifest})
+        deploy_data = deploy_resp.json()
+        deploy_id = deploy_data['id']
+        required_digests = set(deploy_data.get('required') or [])
+        # Carried files can only be referenced, Netlify has to have them already
+        missing = required_digests - {sha1 for _, _, sha1 in files}
+        if missing:
+            raise DeployError(f'Site {site.name} is missing {len(missing)} earlier file(s)')
+        await io.blocking(resume.complete, 'create_deploy', site_id=site_id, deploy_id=deploy_id, required=sorted(required_digests))
+
+    # Step 3: Upload what Netlify asks for, plus anything we never saw it accept,
+    # minus what an earlier attempt at this deploy already uploaded
+    report_step(progress, 'upload_files')
+    already_uploaded = set(resume.state.get('uploaded', []))
+    files_to_upload = [
+        f for f in files
+        if f.path not in already_uploaded and (f.sha1 in required_digests or f.sha1 not in known_digests)
+    ]
+    await upload_netlify_files_io(io, deploy_id, files_to_upload, on_uploaded=resume.file_uploaded)
+
+    # Step 4: Confirm the deploy went ready, otherwise force a full upload
+    report_step(progress, 'wait_ready')
+    forced = False
+    if not await wait_for_netlify_deploy_io(io, deploy_id):
+        forced = True
+        files_to_upload = files
+        await upload_netlify_files_io(io, deploy_id, files)
+        if not await wait_for_netlify_deploy_io(io, deploy_id):
+            raise DeployError(f'Deploy {deploy_id} did not become ready')
+
+    await io.blocking(remember_netlify_digests, files)
+    await io.blocking(resume.finish)
+
+    return {
+        'site_id': site_id,
+        'deploy_id': deploy_id,
+        'deploy_mode': mode,
+        'round_trips': io.netlify.calls_sent() - calls_before,
+        'uploaded_files': [file_path for file_path, _, _ in files_to_upload],
+        'forced_upload': forced,
+        'resumed': resume.resumed,
+        'files': files_manifest,
+    }
+
+
+def build_va_message(handles):
+    """Generate the VA message listing the Linktree URL for each handle"""
+    links = "\n\n".join(f"{handle}:\nhttps://linktr.ee/{handle}" for handle in handles)
+    return f"""Hey,
+
+I'm currently creating Links for every single account. Please add this to your account:
+
+{links}"""
+
+
+def netlify_page_url(creator, handle, files):
+    """Public URL of a handle's landing page, given the paths it was last deployed with"""
+    if files and f"/{handle}/index.html" in files:
+        return f"https://{NETLIFY_CREATOR_SITE_PREFIX}{creator}.netlify.app/{handle}/"
+    return f"https://tt-{handle}.netlify.app"
+
+
+def deploy_handle(creator, handle, background_url, image=None, progress=None):
+    """Render and deploy the landing page for one handle, returns the result dict"""
+    return run_blocking(deploy_handle_io(blocking_io, creator, handle, background_url, image, progress))
+
+
+async def deploy_handle_io(io, creator, handle, background_url, image=None, progress=None):
+    """deploy_handle() over io (blocking_io or event_loop_io)"""
+    if NETLIFY_CONSOLIDATED_SITES:
+        # One deploy shared by the creator's handles, serialized per creator anyway
+        results = await io.blocking(deploy_creator_pages, creator, [handle], background_url, image, progress)
+        return results[0]
+
+    worker_url = await io.blocking(get_worker_url, creator)
+    html_content = generate_netlify_html(worker_url, handle, background_url, image=image)
+    deploy = await deploy_netlify_files_io(io, handle_site(handle), netlify_page_files(handle, html_content, image),
+                                           progress=progress)
+    return await io.blocking(index_handle_deploy, creator, handle, background_url, image, worker_url, deploy)
+
+
+def index_handle_deploy(creator, handle, background_url, image, worker_url, deploy):
+    """Record a handle's deploy_netlify_site() result in the index, returns deploy_handle()'s result dict"""
+    index_deployment(creator, handle, deploy['site_id'], deploy['deploy_id'], deploy['files'])
+    record_page_source(handle, background_url, image)
+
+    return {
+        'handle': handle,
+        'netlify_url': netlify_page_url(creator, handle, deploy['files']),
+        'linktree_url': f"https://linktr.ee/{handle}",
+        'worker_url': f"{worker_url}?acc={handle}",
+        'site_id': deploy['site_id'],
+        'deploy_id': deploy['deploy_id'],
+        'uploaded_files': deploy['uploaded_files'],
+        'resumed': deploy['resumed'],
+        'deploy_mode': deploy['deploy_mode'],
+        'round_trips': deploy['round_trips'],
+    }
+
+
+# Held while a creator's consolidated site is resolved and deployed, so two deploys
+# for the same creator don't each send a manifest missing the other's pages
+_creator_site_locks = KeyedLocks()
+
+
+def find_netlify_site(site_name):
+    """site_id of an existing site by exact name, or None (a slow list query)"""
+    resp = netlify_api.get("/sites", params={"name": site_name})
+    if resp.status_code != 200:
+        return None
+    # the name filter matches substrings
+    return next((site['id'] for site in resp.json() if site.get('name') == site_name), None)
+
+
+def creator_site_manifest(site_id):
+    """path -> SHA-1 of every handle page deployed to a consolidated creator site"""
+    with db_connect() as conn:
+        rows = conn.execute("SELECT files FROM deployments WHERE site_id = ?", (site_id,)).fetchall()
+    if not rows:
+        # No deployment recorded here doesn't mean no pages, the site may predate this database
+        return netlify_site_files(site_id)
+    manifest = {}
+    for row in rows:
+        manifest.update(json.loads(row['files']))
+    return manifest
+
+
+def redirect_netlify_site(site_id, target_url):
+    """Replace a site's content with a permanent redirect of every path to target_url"""
+    data = f"/* {target_url}:splat 301!\n".encode()
+    files = [SiteFile('/_redirects', data, hashlib.sha1(data).hexdigest())]
+    deploy_resp = netlify_api.post(f"/sites/{site_id}/deploys", json={"files": {'/_redirects': files[0].sha1}})
+    if deploy_resp.status_code not in [200, 201]:
+        raise DeployError(f'Failed to create redirect deploy: {deploy_resp.text}')
+    deploy_id = deploy_resp.json()['id']
+    if deploy_resp.json().get('required'):
+        upload_netlify_files(deploy_id, files)
+    if not wait_for_netlify_deploy(deploy_id):
+        raise DeployError(f'Redirect deploy {deploy_id} did not become ready')
+
+
+def deploy_creator_pages(creator, handles, background_url, image=None, progress=None):
+    """Deploy landing pages for handles to the creator's consolidated site, returns result dicts
+
+    Every handle is /{handle}/index.html on one site, so all handles go out
+    in a single deploy and Netlify only asks for the pages that changed. A
+    handle that had its own tt-{handle} site gets that site replaced by a
+    redirect to its new page.
+    """
+    site = creator_site(creator)
+    worker_url = get_worker_url(creator)
+    calls_before = netlify_api.thread_calls()
+
+    pages = {}
+    for handle in handles:
+        html_data = generate_netlify_html(worker_url, handle, background_url, image=image).encode()
+        files = [SiteFile(f"/{handle}/index.html", html_data, hashlib.sha1(html_data).hexdigest())]
+        if image:
+            files.extend(SiteFile(f"/{handle}{f.path}", f.data, f.sha1) for f in image.files)
+        pages[handle] = files
+    new_files = [f for files in pages.values() for f in files]
+
+    report_step(progress, 'create_site')
+    with _creator_site_locks(creator):
+        site_id = site.indexed_id()
+        if site_id is None:
+            site_id = create_netlify_site(site.name)
+            site.index(site_id)
+
+        # Handles not on this site yet, their tt-{handle} site is redirected once the new page is live
+        moving = [handle for handle in handles if serving_site_id(handle) != site_id]
+
+        # Netlify replaces the whole file set per deploy, so resend every page's digest
+        manifest = {**creator_site_manifest(site_id), **{f.path: f.sha1 for f in new_files}}
+        report_step(progress, 'create_deploy')
+        deploy_resp = netlify_api.post(f"/sites/{site_id}/deploys", json={"files": manifest})
+        if deploy_resp.status_code not in [200, 201]:
+            raise DeployError(f'Failed to create deploy: {deploy_resp.text}')
+        deploy_id = deploy_resp.json()['id']
+        required_digests = set(deploy_resp.json().get('required') or [])
+
+        report_step(progress, 'upload_files')
+        known_digests = known_netlify_digests({f.sha1 for f in new_files})
+        files_to_upload = list({
+            f.sha1: f for f in new_files if f.sha1 in required_digests or f.sha1 not in known_digests
+        }.values())
+        upload_netlify_files(deploy_id, files_to_upload)
+
+        report_step(progress, 'wait_ready')
+        if not wait_for_netlify_deploy(deploy_id):
+            raise DeployError(f'Deploy {deploy_id} did not become ready')
+        remember_netlify_digests(new_files)
+
+        for handle, files in pages.items():
+            index_deployment(creator, handle, site_id, deploy_id, {f.path: f.sha1 for f in files})
+            record_page_source(handle, background_url, image)
+
+        # Another gunicorn worker may have deployed handles in the meantime without ours,
+        # deploy once more with everything (Netlify has all the files by now)
+        recorded = creator_site_manifest(site_id)
+        if set(recorded) - set(manifest):
+            retry_resp = netlify_api.post(f"/sites/{site_id}/deploys", json={"files": {**manifest, **recorded}})
+            if retry_resp.status_code in [200, 201]:
+                wait_for_netlify_deploy(retry_resp.json()['id'])
+
+    results = []
+    for handle in handles:
+        page_url = netlify_page_url(creator, handle, {f.path for f in pages[handle]})
+        result = {
+            'handle': handle,
+            'netlify_url': page_url,
+            'linktree_url': f"https://linktr.ee/{handle}",
+            'worker_url': f"{worker_url}?acc={handle}",
+            'site_id': site_id,
+            'deploy_id': deploy_id,
+            'uploaded_files': [f.path for f in files_to_upload if f.path.startswith(f"/{handle}/")],
+            'resumed': False,
+            'deploy_mode': 'consolidated',
+        }
+
+        # Keep the old tt-{handle} URL working (handles deployed before the index existed are looked up)
+        old_site_id = None
+        if handle in moving:
+            old_site_id = indexed_site_id(handle)
+            if old_site_id is None:
+                old_site_id = find_netlify_site(f"tt-{handle}")
+                if old_site_id:
+                    index_site(handle, old_site_id)
+        if old_site_id:
+            report_step(progress, 'redirect_old_site')
+            try:
+                redirect_netlify_site(old_site_id, page_url)
+                result['redirected_from'] = f"https://tt-{handle}.netlify.app"
+            except Exception as e:
+                result['redirect_error'] = str(e)
+        results.append(result)
+
+    # One deploy for every handle, so the round trips are shared
+    for result in results:
+        result['round_trips'] = netlify_api.thread_calls() - calls_before
+    return results
+
+
+def read_deploy_request():
+    """Read a deploy request body, either JSON or multipart/form-data
+
+    Multipart requests carry creator/handle(s) as form fields and either a
+    `background` file or a `background_url` field. The file is passed on as
+    the stream werkzeug spooled it into, so it is never base64/JSON encoded.
+    """
+    if request.mimetype != 'multipart/form-data':
+        return request.get_json()
+
+    data = {key: request.form.get(key, '') for key in ('creator', 'handle', 'handles', 'async')}
+    upload = request.files.get('background')
+    if upload:
+        data['background'] = {'type': 'upload', 'file': upload.stream, 'filename': upload.filename}
+    elif request.form.get('background_url'):
+        data['background'] = {'type': 'url', 'url': request.form['background_url']}
+    return data
+
+
+def reports_peak_memory(view):
+    """Add the request's peak Python heap usage to a JSON response, if asked for with `memory=1`
+
+    Measured with tracemalloc, so it covers the request body and every copy
+    made of it (JSON parsing, base64 decoding). Pillow's pixel buffers are
+    allocated outside the Python allocator and are not included. Tracing
+    slows every allocation in the worker while it runs, so it is opt-in.
+    """
+    if inspect.iscoroutinefunction(view):
+        # ASGI mode: the peak also covers whatever other requests allocate meanwhile
+        @functools.wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            if request.args.get('memory') not in ('1', 'true'):
+                return await view(*args, **kwargs)
+            with traced_peak_memory() as peak:
+                response = await view(*args, **kwargs)
+            return jsonify({**response.get_json(), 'peak_memory_bytes': peak[0]})
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.args.get('memory') not in ('1', 'true'):
+            return view(*args, **kwargs)
+        with traced_peak_memory() as peak:
+            response = view(*args, **kwargs)
+        return jsonify({**response.get_json(), 'peak_memory_bytes': peak[0]})
+    return wrapper
+
+
+@contextmanager
+def traced_peak_memory():
+    """Trace allocations for the block, yields a [peak bytes] cell filled in when it ends"""
+    peak = [None]
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    else:
+        tracemalloc.reset_peak()
+    try:
+        yield peak
+        peak[0] = tracemalloc.get_traced_memory()[1]
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def netlify_deploy_params(data):
+    """(creator, handle, background) of a deploy-netlify request, raises DeployError if incomplete"""
+    creator = data.get('creator', '').lower()
+    handle = normalize_handle(data.get('handle', ''))
+    background = data.get('background', {})
+
+    if not creator or not handle or not background:
+        raise DeployError('Creator, handle and background required')
+
+    if not NETLIFY_API_TOKEN:
+        raise DeployError('NETLIFY_API_TOKEN not configured')
+    return creator, handle, background
+
+
+def enqueue_netlify_deploy(creator, handle, background):
+    """Queue a deploy-netlify job, returns the response dict"""
+    job_id = enqueue_job('deploy-netlify', {
+        'creator': creator,
+        'handle': handle,
+        'background': stash_background(background),
+    })
+    return {'success': True, 'job_id': job_id, 'status_url': f"/api/jobs/{job_id}"}
+
+
+def wants_async(data):
+    """True if the caller asked for the deploy to run as a background job"""
+    return request.args.get('async', data.get('async')) in (True, 1, '1', 'true')
+
+
+def run_netlify_deploy(creator, handle, background, progress=None):
+    """Process the background and deploy one handle, returns the response dict"""
+    return run_blocking(run_netlify_deploy_io(blocking_io, creator, handle, background, progress))
+
+
+async def run_netlify_deploy_io(io, creator, handle, background, progress=None):
+    """run_netlify_deploy() over io, the Pillow work (and asset site publishing) goes through io.blocking()"""
+    image_stats = {}
+    report_step(progress, 'process_image')
+    background_url, image = await io.blocking(prepare_background, background, image_stats, creator)
+    result = await deploy_handle_io(io, creator, handle, background_url, image, progress)
+    return netlify_deploy_response(handle, result, image_stats)
+
+
+def netlify_deploy_response(handle, result, image_stats):
+    """The /api/deploy-netlify response for a deploy_handle() result"""
+    return {
+        'success': True,
+        'netlify_url': result['netlify_url'],
+        'linktree_url': result['linktree_url'],
+        'worker_url': result['worker_url'],
+        'site_id': result['site_id'],
+        'resumed': result['resumed'],
+        'deploy_mode': result['deploy_mode'],
+        'round_trips': result['round_trips'],
+        **{key: result[key] for key in ('redirected_from', 'redirect_error') if key in result},
+        'va_message': build_va_message([handle]),
+        **image_stats
+    }
+
+
+@app.route('/api/deploy-netlify', methods=['POST'])
+@reports_peak_memory
+def api_deploy_netlify():
+    """Deploy a Netlify landing page for a TikTok account (JSON or multipart)
+
+    With `async` set (query string, JSON or form field) the deploy is queued
+    as a job and the response only carries its job_id, see /api/jobs/<id>.
+    """
+    try:
+        data = read_deploy_request()
+        creator, handle, background = netlify_deploy_params(data)
+
+        if wants_async(data):
+            return jsonify(enqueue_netlify_deploy(creator, handle, background))
+
+        return jsonify(run_netlify_deploy(creator, handle, background))
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+@app.route('/api/deploy-netlify-bulk', methods=['POST'])
+def api_deploy_netlify_bulk():
+    """Deploy Netlify landing pages for many TikTok accounts of one creator
+
+    Up to BULK_DEPLOY_SYNC_MAX_HANDLES handles are deployed within the
+    request. Longer lists (or `async`) are queued as a job and the response
+    only carries its job_id, see /api/jobs/<id>.
+    """
+    try:
+        data = read_deploy_request()
+        creator = data.get('creator', '').lower()
+        handles = data.get('handles', [])
+        background = data.get('background', {})
+
+        # Accept a pasted newline/comma separated list as well as a JSON array
+        if isinstance(handles, str):
+            handles = handles.replace(',', '\n').splitlines()
+        handles = list(dict.fromkeys(h for h in map(normalize_handle, handles) if h))
+
+        if not creator or not handles or not background:
+            return jsonify({'success': False, 'error': 'Creator, handles and background required'})
+
+        if len(handles) > BULK_DEPLOY_MAX_HANDLES:
+            return jsonify({'success': False, 'error': f'Too many handles ({len(handles)}), max {BULK_DEPLOY_MAX_HANDLES}'})
+
+        if not NETLIFY_API_TOKEN:
+            return jsonify({'success': False, 'error': 'NETLIFY_API_TOKEN not configured'})
+
+        if wants_async(data) or len(handles) > BULK_DEPLOY_SYNC_MAX_HANDLES:
+            job_id = enqueue_job('deploy-netlify-bulk', {
+                'creator': creator,
+                'handles': handles,
+                'background': stash_background(background),
+            })
+            return jsonify({'success': True, 'job_id': job_id, 'status_url': f"/api/jobs/{job_id}"})
+
+        return jsonify(run_bulk_deploy(creator, handles, background))
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+def run_bulk_deploy(creator, handles, background, progress=None):
+    """Process the background once and deploy every handle, returns the response dict
+
+    The per-handle site/deploy/upload steps run through a bounded thread
+    pool. With consolidated sites all handles go out in one deploy of the
+    creator's site instead.
+    """
+    image_stats = {}
+    report_step(progress, 'process_image')
+    background_url, image = prepare_background(background, image_stats, creator)
+
+    report_step(progress, 'deploy_handles')
+    completed = []
+    completed_lock = threading.Lock()
+
+    def run(handle):
+        try:
+            result = {'success': True, **deploy_handle(creator, handle, background_url, image)}
+        except Exception as e:
+            result = {'handle': handle, 'success': False, 'error': str(e)}
+        with completed_lock:
+            completed.append(handle)
+            report_count(progress, len(completed), len(handles))
+        return result
+
+    if NETLIFY_CONSOLIDATED_SITES:
+        try:
+            results = [{'success': True, **result}
+                       for result in deploy_creator_pages(creator, handles, background_url, image)]
+        except Exception as e:
+            results = [{'handle': handle, 'success': False, 'error': str(e)} for handle in handles]
+    else:
+        with ThreadPoolExecutor(max_workers=min(BULK_DEPLOY_CONCURRENCY, len(handles))) as pool:
+            results = [future.result() for future in [submit_in_context(pool, run, handle) for handle in handles]]
+
+    deployed = [r['handle'] for r in results if r['success']]
+
+    return {
+        'success': len(deployed) == len(results),
+        'deployed': len(deployed),
+        'failed': len(results) - len(deployed),
+        'results': results,
+        'va_message': build_va_message(deployed) if deployed else '',
+        **image_stats
+    }
+
+
+@app.route('/api/deployments')
+def api_deployments():
+    """List indexed landing page deployments
+
+    Query params: `creator`, `q` (handle prefix), `limit` and `after` (the last
+    handle of the previous page). Results are ordered by handle.
+    """
+    try:
+        creator = request.args.get('creator', '').lower()
+        prefix = normalize_handle(request.args.get('q'))
+        after = normalize_handle(request.args.get('after'))
+        limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+
+        where, params = [], []
+        if creator:
+            where.append("creator = ?")
+            params.append(creator)
+        if prefix:
+            # Range scan over the handle index instead of a LIKE table scan
+            where.append("handle >= ? AND handle < ?")
+            params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+        if after:
+            where.append("handle > ?")
+            params.append(after)
+
+        with db_connect() as conn:
+            rows = conn.execute(
+                "SELECT handle, creator, site_id, deploy_id, files, created_at, deployed_at FROM deployments "
+                f"{'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY handle LIMIT ?",
+                params + [limit]
+            ).fetchall()
+
+        deployments = [
+            {**dict(row), 'files': json.loads(row['files']),
+             'netlify_url': netlify_page_url(row['creator'], row['handle'], json.loads(row['files']))}
+            for row in rows
+        ]
+        return jsonify({
+            'success': True,
+            'deployments': deployments,
+            'next': deployments[-1]['handle'] if len(deployments) == limit else None,
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+WORKER_METADATA = {
+    "main_module": "worker.js",
+    "compatibility_date": "2024-01-01"
+}
+
+
+def worker_content_hash(worker_code, metadata=WORKER_METADATA):
+    """Hash of everything uploaded for a worker script, to detect unchanged redeploys"""
+    content = json.dumps({'code': worker_code, 'metadata': metadata}, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def get_deployed_worker_hashes():
+    """Map worker name -> content hash of the script we last uploaded"""
+    try:
+        with db_connect() as conn:
+            rows = conn.execute("SELECT worker_name, content_hash FROM worker_scripts").fetchall()
+    except sqlite3.Error:
+        return {}
+    return {row['worker_name']: row['content_hash'] for row in rows}
+
+
+async def upload_worker_script_io(io, worker_name, worker_code):
+    """PUT a worker script (ES module) and record its content hash on success"""
+    # Deploy worker using multipart form-data for ES modules
+    resp = await io.cloudflare.put(f"/workers/scripts/{worker_name}", files=worker_script_files(worker_code))
+
+    if resp.json().get('success'):
+        await io.blocking(remember_worker_script, worker_name, worker_code)
+    return resp
+
+
+def worker_script_files(worker_code):
+    """Multipart body of a worker script upload"""
+    return {
+        "worker.js": ("worker.js", worker_code, "application/javascript+module"),
+        "metadata": ("metadata.json", json.dumps(WORKER_METADATA), "application/json")
+    }
+
+
+def remember_worker_script(worker_name, worker_code):
+    """Record the content hash of a script that uploaded successfully"""
+    try:
+        with db_connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO worker_scripts (worker_name, content_hash, deployed_at) VALUES (?, ?, ?)",
+                (worker_name, worker_content_hash(worker_code), time.time())
+            )
+    except sqlite3.Error:
+        pass  # the next redeploy just uploads it again
+
+
+def supabase_creator_row(name):
+    """of_creators row registering a new creator"""
+    return {
+        "name": name.capitalize(),
+        "account_prefix": name,
+        "persona": "girlfriend",
+        "is_active": True,
+        "active_accounts_count": 0
+    }
+
+
+def worker_deploy_plan(name, of_url_us, of_url_de):
+    """(creator_config, worker_name, worker_code, worker_url) for deploying a creator's worker
+
+    creator_config holds only the keys this deploy sets, see register_creator_config().
+    A creator whose config names a legacy worker (miri2, suki2) keeps deploying to it.
+    """
+    creator_config = {
+        "of_us": of_url_us,
+        "of_de": of_url_de if of_url_de != of_url_us else None,
+        "has_dach": of_url_de != of_url_us
+    }
+    existing = creator_registry.get(name) or {}
+
+    if MULTI_TENANT_WORKER:
+        creator_config["multi_tenant"] = True
+        if existing and not existing.get('multi_tenant'):
+            # Moving over from its own script, which stays live, see legacy_worker_name()
+            creator_config["worker"] = existing.get('worker') or f"{name}2"
+        worker_name = MULTI_TENANT_WORKER
+        creators = {**creator_registry.snapshot(), name: {**existing, **creator_config}}
+        worker_code = generate_multi_tenant_worker_code(multi_tenant_routes(creators))
+        worker_url = f"https://{worker_name}.signaturenorthwest.workers.dev/{name}"
+    else:
+        worker_name = existing.get('worker') or f"{name}2"
+        worker_code = generate_worker_code(name, of_url_us, of_url_de)
+        worker_url = f"https://{worker_name}.signaturenorthwest.workers.dev"
+    return creator_config, worker_name, worker_code, worker_url
+
+
+def register_creator_config(name, creator_config):
+    """Merge a worker deploy's config into the creator's entry, keeping keys it doesn't set"""
+    creator_registry.update(name, creator_config, drop=() if creator_config.get('multi_tenant') else ('multi_tenant',))
+
+
+def deploy_worker(name, of_url_us, of_url_de, progress=None):
+    """Deploy the creator's Cloudflare Worker ({name}2 by default) and register the creator, returns the response dict
+
+    With MULTI_TENANT_WORKER set the creator is added to the shared worker's
+    routing table instead, which is one upload of that script. A retry after
+    a failed step resumes after the last step that completed.
+    """
+    return run_blocking(deploy_worker_io(blocking_io, name, of_url_us, of_url_de, progress))
+
+
+async def deploy_worker_io(io, name, of_url_us, of_url_de, progress=None):
+    """deploy_worker() over io
+
+    Once the script is uploaded, its secrets, the workers.dev route and the
+    Supabase registration don't depend on each other, so the ASGI mode sends
+    them together. Each records its own step either way.
+    """
+    creator_config, worker_name, worker_code, worker_url = await io.blocking(
+        worker_deploy_plan, name, of_url_us, of_url_de
+    )
+
+    deployed_hashes = await io.blocking(get_deployed_worker_hashes)
+    deployed_hash = deployed_hashes.get(worker_name)
+    code_hash = worker_content_hash(worker_code)
+    resume = await io.blocking(DeployProgress, f"worker:{worker_name}:{name}:{code_hash}")
+    # The shared worker already has its secrets and route after its first deploy
+    configure_script = not (MULTI_TENANT_WORKER and deployed_hash)
+    legacy_worker = None
+    if MULTI_TENANT_WORKER:
+        existing = await io.blocking(creator_registry.get, name)
+        legacy_worker = legacy_worker_name(name, {**(existing or {}), **creator_config}, deployed_hashes)
+
+    if not resume.done('upload_script'):
+        report_step(progress, 'upload_script')
+        if deployed_hash != code_hash:
+            deploy_resp = await upload_worker_script_io(io, worker_name, worker_code)
+
+            if not deploy_resp.json().get('success'):
+                raise DeployError(f'Failed to deploy worker: {deploy_resp.text}')
+        await io.blocking(resume.complete, 'upload_script')
+
+    async def set_secret(secret_name, secret_value):
+        secret_resp = await io.cloudflare.put(
+            f"/workers/scripts/{worker_name}/secrets",
+            json={"name": secret_name, "text": secret_value}
+        )
+        if secret_resp.status_code not in [200, 201]:
+            raise DeployError(f'Failed to set {secret_name}: {secret_resp.text}')
+
+    async def set_secrets():
+        # Set worker secrets
+        report_step(progress, 'set_secrets')
+        await io.gather(*(
+            set_secret(secret_name, secret_value)
+            for secret_name, secret_value in [("SUPABASE_URL", SUPABASE_URL), ("SUPABASE_SERVICE_KEY", SUPABASE_SERVICE_KEY)]
+            if secret_value
+        ))
+        await io.blocking(resume.complete, 'set_secrets')
+
+    async def enable_subdomain():
+        # Enable workers.dev route
+        report_step(progress, 'enable_subdomain')
+        subdomain_resp = await io.cloudflare.post(f"/workers/scripts/{worker_name}/subdomain", json={"enabled": True})
+        if subdomain_resp.status_code not in [200, 201]:
+            raise DeployError(f'Failed to enable workers.dev route: {subdomain_resp.text}')
+        await io.blocking(resume.complete, 'enable_subdomain')
+
+    async def update_legacy_script():
+        # Pages deployed before the creator moved to the shared worker still link to this one
+        report_step(progress, 'update_legacy_script')
+        legacy_code = generate_worker_code(name, of_url_us, of_url_de)
+        if deployed_hashes.get(legacy_worker) != worker_content_hash(legacy_code):
+            legacy_resp = await upload_worker_script_io(io, legacy_worker, legacy_code)
+            if not legacy_resp.json().get('success'):
+                raise DeployError(f'Failed to update {legacy_worker}: {legacy_resp.text}')
+        await io.blocking(resume.complete, 'update_legacy_script')
+
+    async def register_creator():
+        # Create creator in Supabase database
+        report_step(progress, 'register_creator')
+        register_resp = await io.supabase.post(
+            "/rest/v1/of_creators",
+            headers={"Prefer": "return=minimal"},
+            json=supabase_creator_row(name)
+        )
+        if register_resp.status_code >= 500:
+            raise DeployError(f'Failed to register creator: {register_resp.text}')
+        await io.blocking(resume.complete, 'register_creator')
+
+    steps = []
+    if configure_script and not resume.done('set_secrets'):
+        steps.append(set_secrets())
+    if configure_script and not resume.done('enable_subdomain'):
+        steps.append(enable_subdomain())
+    if legacy_worker and not resume.done('update_legacy_script'):
+        steps.append(update_legacy_script())
+    if SUPABASE_SERVICE_KEY and not resume.done('register_creator'):
+        steps.append(register_creator())
+    await io.gather(*steps)
+
+    # Register the creator for every worker
+    await io.blocking(register_creator_config, name, creator_config)
+
+    await io.blocking(resume.finish)
+    return {
+        'success': True,
+        'worker_url': worker_url,
+        'worker_name': worker_name,
+        'resumed': resume.resumed
+    }
+
+
+def worker_deploy_params(data):
+    """(name, of_url_us, of_url_de) of a deploy-worker request, raises DeployError if incomplete"""
+    name = data.get('name', '').lower()
+    of_url_us = data.get('of_url_us', '')
+    of_url_de = data.get('of_url_de', '') or of_url_us
+
+    if not name or not of_url_us:
+        raise DeployError('Name and OF URL required')
+
+    if not CLOUDFLARE_API_TOKEN:
+        raise DeployError('CLOUDFLARE_API_TOKEN not configured')
+    return name, of_url_us, of_url_de
+
+
+@app.route('/api/deploy-worker', methods=['POST'])
+def api_deploy_worker():
+    """Deploy a new Cloudflare Worker for a creator (queued as a job with `async`)"""
+    try:
         data = request.get_json()
-        creator = data.get('creator', '').lower()
-        handle = data.get('handle', '').lower().replace('@', '')
-        background = data.get('background', {})
+        name, of_url_us, of_url_de = worker_deploy_params(data)
 
-        if not creator or not handle or not background:
-            return jsonify({'success': False, 'error': 'Creator, handle and background required'})
+        if wants_async(data):
+            job_id = enqueue_job('deploy-worker', {'name': name, 'of_url_us': of_url_us, 'of_url_de': of_url_de})
+            return jsonify({'success': True, 'job_id': job_id, 'status_url': f"/api/jobs/{job_id}"})
 
-        if not NETLIFY_API_TOKEN:
-            return jsonify({'success': False, 'error': 'NETLIFY_API_TOKEN not configured'})
+        return jsonify(deploy_worker(name, of_url_us, of_url_de))
 
-        # Get worker name - check config for custom names (miri2, suki2), otherwise use pattern {creator}2
-        creator_config = CREATORS_CONFIG.get(creator, {})
-        worker_name = creator_config.get('worker', f"{creator}2")
-        worker_url = f"https://{worker_name}.signaturenorthwest.workers.dev"
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
 
-        # Handle background image
-        bg_type = background.get('type')
-        image_data = None
-
-        if bg_type == 'url':
-            # Use external URL
-            background_url = background.get('url', '')
-            html_content = generate_netlify_html(worker_url, handle, background_url)
-        elif bg_type == 'upload':
-            # Use uploaded image - compress and resize before deploying
-            background_url = 'background.jpg'
-            html_content = generate_netlify_html(worker_url, handle, background_url)
-
-            # Decode base64 image data
-            raw_image_data = base64.b64decode(background.get('data', ''))
-
-            # Compress image with Pillow
-            img = Image.open(BytesIO(raw_image_data))
-
-            # Convert to RGB if necessary (handles PNG with transparency, etc.)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-
-            # Resize if width exceeds 1920px (maintain aspect ratio)
-            max_width = 1920
-            if img.width > max_width:
-                ratio = max_width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-
-            # Save as JPEG with 85% quality
-            output_buffer = BytesIO()
-            img.save(output_buffer, format='JPEG', quality=85, optimize=True)
-            image_data = output_buffer.getvalue()
-        else:
-            return jsonify({'success': False, 'error': 'Invalid background type'})
-
-        site_name = f"tt-{handle}"
-
-        # Step 1: Create site (or get existing)
-        create_resp = http_requests.post(
-            "https://api.netlify.com/api/v1/sites",
-            headers={
-                "Authorization": f"Bearer {NETLIFY_API_TOKEN}",
-                "Content-Type": "application/json"
-            },
-            json={"name": site_name}
-        )
 
-        if create_resp.status_code not in [200, 201]:
-            sites_resp = http_requests.get(
-                f"https://api.netlify.com/api/v1/sites?name={site_name}",
-                headers={"Authorization": f"Bearer {NETLIFY_API_TOKEN}"}
-            )
-            sites = sites_resp.json()
-            if sites:
-                site_id = sites[0]['id']
-            else:
-                return jsonify({'success': False, 'error': f'Failed to create site: {create_resp.text}'})
-        else:
-            site_id = create_resp.json()['id']
-
-        # Step 2: Create deploy with file manifest
-        html_hash = hashlib.sha1(html_content.encode()).hexdigest()
-        files_manifest = {"/index.html": html_hash}
-
-        if image_data:
-            image_hash = hashlib.sha1(image_data).hexdigest()
-            files_manifest["/background.jpg"] = image_hash
-
-        deploy_resp = http_requests.post(
-            f"https://api.netlify.com/api/v1/sites/{site_id}/deploys",
-            headers={
-                "Authorization": f"Bearer {NETLIFY_API_TOKEN}",
-                "Content-Type": "application/json"
-            },
-            json={"files": files_manifest}
-        )
+async def redeploy_worker_io(io, creator_name, config, deployed_hash=None):
+    """Upload the latest worker code for one creator, returns the result dict
+
+    Skipped (success, skipped=True) when the generated code hashes to
+    deployed_hash, the hash of the script we last uploaded.
+    """
+    worker_name = config.get('worker') or f"{creator_name}2"
+    of_url_us = config.get('of_us', '')
+    of_url_de = config.get('of_de') or of_url_us
+
+    if not of_url_us:
+        return {'creator': creator_name, 'success': False, 'error': 'no of_url_us'}
+
+    worker_code = generate_worker_code(creator_name, of_url_us, of_url_de)
+    return await push_worker_script_io(io, creator_name, worker_name, worker_code, deployed_hash)
+
 
+async def push_worker_script_io(io, creator_name, worker_name, worker_code, deployed_hash=None):
+    """Upload worker_code unless it hashes to deployed_hash, returns the redeploy result dict"""
+    if deployed_hash == worker_content_hash(worker_code):
+        return {'creator': creator_name, 'worker': worker_name, 'success': True, 'skipped': True, 'duration_ms': 0}
+
+    started = time.monotonic()
+    try:
+        resp = await upload_worker_script_io(io, worker_name, worker_code)
+        result = {'creator': creator_name, 'worker': worker_name, 'success': resp.json().get('success', False), 'skipped': False}
+        if resp.status_code == 429:
+            result['error'] = 'rate limited by Cloudflare'
+    except Exception as e:
+        result = {'creator': creator_name, 'worker': worker_name, 'success': False, 'error': str(e)}
+
+    result['duration_ms'] = round((time.monotonic() - started) * 1000)
+    return result
+
+
+async def redeploy_worker_steps(io, creators, force=False):
+    """One coroutine per worker upload of a redeploy, see iter_redeploy_results()"""
+    deployed = await io.blocking(get_deployed_worker_hashes)
+    deployed_hashes = {} if force else deployed
+
+    # Creators on the shared worker only have a script of their own if it predates the move
+    steps = [
+        redeploy_worker_io(io, name, config, deployed_hashes.get(config.get('worker') or f"{name}2"))
+        for name, config in creators.items()
+        if not config.get('multi_tenant') or legacy_worker_name(name, config, deployed)
+    ]
+    if MULTI_TENANT_WORKER:
+        # One script for every creator, always built from the full config
+        worker_code = generate_multi_tenant_worker_code(multi_tenant_routes(await io.blocking(creator_registry.snapshot)))
+        steps.append(push_worker_script_io(io, '*', MULTI_TENANT_WORKER, worker_code, deployed_hashes.get(MULTI_TENANT_WORKER)))
+    return steps
+
+
+def iter_redeploy_results(creators, force=False):
+    """Redeploy workers over a bounded pool, yielding results as each finishes
+
+    Unless force is set, workers whose generated code is unchanged since the
+    last upload are skipped. With MULTI_TENANT_WORKER set, the shared worker is
+    one more upload (creator '*'). Its creators' own scripts are only
+    redeployed if they predate the move, see legacy_worker_name().
+    """
+    steps = run_blocking(redeploy_worker_steps(blocking_io, creators, force))
+    if not steps:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(REDEPLOY_CONCURRENCY, len(steps))) as pool:
+        futures = [submit_in_context(pool, run_blocking, step) for step in steps]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# Reasons redeploy-all-pages skips a handle it can't re-render
+PAGE_NOT_RECORDED = 'deployed before render inputs were recorded'
+PAGE_NOT_INDEXED = 'site exists on Netlify but is not in the deployment index'
+
+
+def landing_page_sources(creators=None):
+    """Deployed handles with their site, files and recorded render inputs, ordered by creator and handle"""
+    query = (
+        "SELECT d.handle, d.creator, d.site_id, d.files, p.background_url, p.variants, p.placeholder "
+        "FROM deployments d LEFT JOIN page_sources p ON p.handle = d.handle WHERE d.deploy_id IS NOT NULL"
+    )
+    params = []
+    if creators:
+        query += f" AND d.creator IN ({','.join('?' * len(creators))})"
+        params.extend(creators)
+    with db_connect() as conn:
+        return conn.execute(query + " ORDER BY d.creator, d.handle", params).fetchall()
+
+
+def render_landing_page(row):
+    """Render a deployed handle's page again, returns (path, SiteFile) with its current path on the site"""
+    files = json.loads(row['files'])
+    handle = row['handle']
+    path = f"/{handle}/index.html" if f"/{handle}/index.html" in files else "/index.html"
+    image = None
+    if row['variants']:
+        image = BackgroundImage([], [tuple(variant) for variant in json.loads(row['variants'])], row['placeholder'])
+    html_data = generate_netlify_html(get_worker_url(row['creator']), handle, row['background_url'], image=image).encode()
+    return SiteFile(path, html_data, hashlib.sha1(html_data).hexdigest())
+
+
+def redeploy_landing_site(site_id, pages):
+    """Deploy re-rendered pages [(row, SiteFile)] of one site, returns the deploy_id
+
+    Every other file on the site keeps its digest, so the new index.html
+    files are all Netlify asks for.
+    """
+    consolidated = any(page.path != "/index.html" for _, page in pages)
+    with _creator_site_locks(pages[0][0]['creator']) if consolidated else nullcontext():
+        manifest = {**creator_site_manifest(site_id), **{page.path: page.sha1 for _, page in pages}}
+        deploy_resp = netlify_api.post(f"/sites/{site_id}/deploys", json={"files": manifest})
         if deploy_resp.status_code not in [200, 201]:
-            return jsonify({'success': False, 'error': f'Failed to create deploy: {deploy_resp.text}'})
+            raise DeployError(f'Failed to create deploy: {deploy_resp.text}')
 
-        deploy_data = deploy_resp.json()
-        deploy_id = deploy_data['id']
-        required_files = deploy_data.get('required', [])
-
-        # Step 3: Upload files
-        # Always upload HTML and image - Netlify's 'required' check was causing issues
-        files_to_upload = [('/index.html', html_content.encode())]
-        if image_data:
-            files_to_upload.append(('/background.jpg', image_data))
-
-        for file_path, file_data in files_to_upload:
-            upload_resp = http_requests.put(
-                f"https://api.netlify.com/api/v1/deploys/{deploy_id}/files{file_path}",
-                headers={
-                    "Authorization": f"Bearer {NETLIFY_API_TOKEN}",
-                    "Content-Type": "application/octet-stream"
-                },
-                data=file_data
-            )
+        deploy_id = deploy_resp.json()['id']
+        required = set(deploy_resp.json().get('required') or [])
+        missing = required - {page.sha1 for _, page in pages}
+        if missing:
+            raise DeployError(f'Site is missing {len(missing)} earlier file(s), deploy it from the panel')
+        upload_netlify_files(deploy_id, [page for _, page in pages if page.sha1 in required])
 
-            # Handle upload response - 422 "no records matched" means file is already in cache
-            if upload_resp.status_code == 422:
-                # File already exists in Netlify cache - this is OK, continue
-                pass
-            elif upload_resp.status_code not in [200, 201]:
-                return jsonify({'success': False, 'error': f'Failed to upload {file_path}: {upload_resp.text}'})
+        if not wait_for_netlify_deploy(deploy_id):
+            raise DeployError(f'Deploy {deploy_id} did not become ready')
+        remember_netlify_digests([page for _, page in pages])
 
-        netlify_url = f"https://{site_name}.netlify.app"
-        linktree_url = f"https://linktr.ee/{handle}"
+        for row, page in pages:
+            files = {**json.loads(row['files']), page.path: page.sha1}
+            index_deployment(row['creator'], row['handle'], site_id, deploy_id, files)
+    return deploy_id
 
-        # Generate VA message
-        va_message = f"""Hey,
 
-I'm currently creating Links for every single account. Please add this to your account:
+def unindexed_site_results():
+    """A skipped redeploy-all-pages result for each tt-{handle} site on Netlify missing from the index
 
-{handle}:
-{linktree_url}"""
+    Lists the account's sites NETLIFY_SITES_PAGE_SIZE at a time, so it costs
+    one call per page of sites.
+    """
+    with db_connect() as conn:
+        indexed = {row['handle'] for row in conn.execute("SELECT handle FROM deployments UNION SELECT handle FROM handle_sites")}
 
-        return jsonify({
-            'success': True,
-            'netlify_url': netlify_url,
-            'linktree_url': linktree_url,
-            'worker_url': f"{worker_url}?acc={handle}",
-            'site_id': site_id,
-            'va_message': va_message
-        })
+    handles = []
+    page = 1
+    while True:
+        resp = netlify_api.get("/sites", params={"name": "tt-", "page": page, "per_page": NETLIFY_SITES_PAGE_SIZE})
+        if resp.status_code != 200:
+            raise DeployError(f'Failed to list Netlify sites: {resp.text}')
+        sites = resp.json()
+        # the name filter matches substrings
+        handles.extend(site['name'][3:] for site in sites if site.get('name', '').startswith('tt-'))
+        if len(sites) < NETLIFY_SITES_PAGE_SIZE:
+            break
+        page += 1
+
+    return [{'handle': handle, 'creator': None, 'success': True, 'skipped': True, 'reason': PAGE_NOT_INDEXED}
+            for handle in sorted(set(handles) - indexed)]
+
+
+def iter_page_redeploy_results(rows, force=False):
+    """Re-render every page and redeploy the sites whose HTML changed, yielding one result per handle
 
+    Pages whose SHA-1 matches the deployed index.html are skipped unless
+    force is set. Changed pages are grouped per site (a consolidated site
+    takes one deploy for all its handles) and the sites deploy over a
+    bounded pool.
+    """
+    sites = {}
+    for row in rows:
+        result = {'handle': row['handle'], 'creator': row['creator'], 'success': True}
+        if not row['background_url']:
+            yield {**result, 'skipped': True, 'reason': PAGE_NOT_RECORDED}
+            continue
+        page = render_landing_page(row)
+        if not force and json.loads(row['files']).get(page.path) == page.sha1:
+            yield {**result, 'skipped': True, 'reason': 'unchanged'}
+            continue
+        sites.setdefault(row['site_id'], []).append((row, page))
+
+    def run(site_id, pages):
+        try:
+            deploy_id = redeploy_landing_site(site_id, pages)
+            return [{'handle': row['handle'], 'creator': row['creator'], 'success': True, 'deploy_id': deploy_id}
+                    for row, _ in pages]
+        except Exception as e:
+            return [{'handle': row['handle'], 'creator': row['creator'], 'success': False, 'error': str(e)}
+                    for row, _ in pages]
+
+    if not sites:
+        return
+    with ThreadPoolExecutor(max_workers=min(PAGE_REDEPLOY_CONCURRENCY, len(sites))) as pool:
+        futures = [submit_in_context(pool, run, site_id, pages) for site_id, pages in sites.items()]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+@app.route('/api/redeploy-all-workers', methods=['POST'])
+def api_redeploy_all_workers():
+    """Redeploy all creator workers with the latest worker code
+
+    `creators` (comma separated query param or JSON list) limits the redeploy
+    to those creators. With `stream=1` the response is NDJSON: one line per
+    worker as soon as it finishes, then a summary line. Workers whose code
+    hasn't changed since their last upload are skipped unless `force` is set.
+    """
+    if not CLOUDFLARE_API_TOKEN:
+        return jsonify({'success': False, 'error': 'CLOUDFLARE_API_TOKEN not configured'})
+    try:
+        selected, force = redeploy_params()
+    except DeployError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    creators = redeploy_creators(selected)
+    started = time.monotonic()
+
+    if request.args.get('stream') in ('1', 'true'):
+        def generate():
+            results = []
+            for result in iter_redeploy_results(creators, force):
+                results.append(result)
+                yield json.dumps(result) + "\n"
+            yield json.dumps({'done': True, **redeploy_summary(results, started)}) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    results = sorted_redeploy_results(creators, iter_redeploy_results(creators, force))
+
+    return jsonify({**redeploy_summary(results, started), 'results': results})
+
+
+def redeploy_params():
+    """(selected creators, force) of a redeploy-all-* request, raises DeployError for unknown creators
+
+    An empty selection means every creator.
+    """
+    data = request.get_json(silent=True) or {}
+    selected = data.get('creators') or request.args.get('creators', '')
+    if isinstance(selected, str):
+        selected = [name.strip() for name in selected.split(',')]
+    selected = [name.lower() for name in selected if name]
+
+    all_creators = creator_registry.snapshot()
+    unknown = [name for name in selected if name not in all_creators]
+    if unknown:
+        raise DeployError(f"Unknown creators: {', '.join(unknown)}")
+
+    force = request.args.get('force', data.get('force')) in (True, 1, '1', 'true')
+    return selected, force
+
+
+def redeploy_creators(selected):
+    """{name: config} of the selected creators (all if none are), in config order"""
+    return {name: config for name, config in creator_registry.snapshot().items() if not selected or name in selected}
+
+
+def redeploy_summary(results, started):
+    return {
+        'success': all(r['success'] for r in results),
+        'uploaded': [r['worker'] for r in results if r['success'] and not r.get('skipped')],
+        'skipped': [r['worker'] for r in results if r.get('skipped')],
+        'total_ms': round((time.monotonic() - started) * 1000),
+    }
+
+
+def sorted_redeploy_results(creators, results):
+    """Results in config order (shared worker last), however the uploads finished"""
+    order = list(creators) + ['*']
+    return sorted(results, key=lambda r: order.index(r['creator']))
+
+
+@app.route('/api/redeploy-all-pages', methods=['POST'])
+def api_redeploy_all_pages():
+    """Re-render every deployed landing page and redeploy the ones whose HTML changed
+
+    `creators` (comma separated query param or JSON list) limits it to those
+    creators, `force` redeploys unchanged pages too. With `stream=1` the
+    response is NDJSON: one line per handle with the running count, then a
+    summary line. Backgrounds are never uploaded again, only index.html.
+
+    Only indexed handles can be re-rendered. Without a creators filter, tt-*
+    sites on the Netlify account that aren't in the index are reported too.
+    """
+    if not NETLIFY_API_TOKEN:
+        return jsonify({'success': False, 'error': 'NETLIFY_API_TOKEN not configured'})
+
+    try:
+        selected, force = redeploy_params()
+        rows = landing_page_sources(selected)
+        unindexed = [] if selected else unindexed_site_results()
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
+    started = time.monotonic()
+    total = len(rows) + len(unindexed)
 
+    def summary(results):
+        return {
+            'success': all(r['success'] for r in results),
+            'redeployed': [r['handle'] for r in results if r['success'] and not r.get('skipped')],
+            'unchanged': sum(1 for r in results if r.get('reason') == 'unchanged'),
+            'not_recorded': [r['handle'] for r in results if r.get('reason') == PAGE_NOT_RECORDED],
+            'unindexed': [r['handle'] for r in results if r.get('reason') == PAGE_NOT_INDEXED],
+            'failed': [r['handle'] for r in results if not r['success']],
+            'total_ms': round((time.monotonic() - started) * 1000),
+        }
+
+    if request.args.get('stream') in ('1', 'true'):
+        def generate():
+            results = []
+            for result in itertools.chain(iter_page_redeploy_results(rows, force), unindexed):
+                results.append(result)
+                yield json.dumps({**result, 'completed': len(results), 'total': total}) + "\n"
+            yield json.dumps({'done': True, **summary(results)}) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    results = sorted(itertools.chain(iter_page_redeploy_results(rows, force), unindexed),
+                     key=lambda r: (r['creator'] or '', r['handle']))
+
+    return jsonify({**summary(results), 'results': results})
+
+
+# ---------------------------------------------------------------------------
+# Deploy job queue
+#
+# Jobs live in the shared SQLite database, so any gunicorn worker can pick up
+# a job another one queued, and queued jobs survive a restart. Each worker
+# runs a dispatcher thread that claims queued jobs and runs them on a small
+# thread pool.
+# ---------------------------------------------------------------------------
+
+def stash_background(background):
+    """Make a background payload JSON-serializable for the job queue
+
+    Uploaded images are written to JOB_UPLOAD_DIR and referenced by path.
+    """
+    if background.get('type') != 'upload':
+        return background
+
+    image_file = background.get('file') or decode_background_data(background)
+    os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(JOB_UPLOAD_DIR, uuid.uuid4().hex)
+    with open(path, 'wb') as f:
+        for chunk in iter(lambda: image_file.read(64 * 1024), b''):
+            f.write(chunk)
+    return {'type': 'upload_path', 'path': path}
+
+
+@contextmanager
+def unstash_background(background):
+    """The background payload of a job, with a stashed upload opened (and removed afterwards)"""
+    if background.get('type') != 'upload_path':
+        yield background
+        return
 
-@app.route('/api/deploy-worker', methods=['POST'])
-def api_deploy_worker():
-    """Deploy a new Cloudflare Worker for a creator"""
     try:
-        data = request.get_json()
-        name = data.get('name', '').lower()
-        of_url_us = data.get('of_url_us', '')
-        of_url_de = data.get('of_url_de', '') or of_url_us
+        with open(background['path'], 'rb') as image_file:
+            yield {'type': 'upload', 'file': image_file}
+    finally:
+        try:
+            os.remove(background['path'])
+        except FileNotFoundError:
+            pass
 
-        if not name or not of_url_us:
-            return jsonify({'success': False, 'error': 'Name and OF URL required'})
 
-        if not CLOUDFLARE_API_TOKEN:
-            return jsonify({'success': False, 'error': 'CLOUDFLARE_API_TOKEN not configured'})
+def run_netlify_job(payload, progress):
+    with unstash_background(payload['background']) as background:
+        return run_netlify_deploy(payload['creator'], payload['handle'], background, progress)
 
-        worker_name = f"{name}2"
-        worker_code = generate_worker_code(name, of_url_us, of_url_de)
 
-        # Deploy worker using multipart form-data for ES modules
-        import json as json_lib
-        metadata = {
-            "main_module": "worker.js",
-            "compatibility_date": "2024-01-01"
-        }
+def run_bulk_job(payload, progress):
+    with unstash_background(payload['background']) as background:
+        return run_bulk_deploy(payload['creator'], payload['handles'], background, progress)
 
-        deploy_resp = http_requests.put(
-            f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/workers/scripts/{worker_name}",
-            headers={
-                "Authorization": f"Bearer {CLOUDFLARE_API_TOKEN}",
-            },
-            files={
-                "worker.js": ("worker.js", worker_code, "application/javascript+module"),
-                "metadata": ("metadata.json", json_lib.dumps(metadata), "application/json")
-            }
-        )
 
-        if not deploy_resp.json().get('success'):
-            return jsonify({'success': False, 'error': f'Failed to deploy worker: {deploy_resp.text}'})
+def run_worker_job(payload, progress):
+    return deploy_worker(payload['name'], payload['of_url_us'], payload['of_url_de'], progress)
 
-        # Set worker secrets
-        for secret_name, secret_value in [
-            ("SUPABASE_URL", SUPABASE_URL),
-            ("SUPABASE_SERVICE_KEY", SUPABASE_SERVICE_KEY)
-        ]:
-            if secret_value:
-                http_requests.put(
-                    f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/workers/scripts/{worker_name}/secrets",
-                    headers={
-                        "Authorization": f"Bearer {CLOUDFLARE_API_TOKEN}",
-                        "Content-Type": "application/json"
-                    },
-                    json={"name": secret_name, "text": secret_value}
-                )
 
-        # Enable workers.dev route
-        http_requests.post(
-            f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/workers/scripts/{worker_name}/subdomain",
-            headers={
-                "Authorization": f"Bearer {CLOUDFLARE_API_TOKEN}",
-                "Content-Type": "application/json"
-            },
-            json={"enabled": True}
+JOB_HANDLERS = {
+    'deploy-netlify': run_netlify_job,
+    'deploy-netlify-bulk': run_bulk_job,
+    'deploy-worker': run_worker_job,
+}
+
+
+def enqueue_job(kind, payload):
+    """Persist a queued job and wake this worker's dispatcher, returns the job id"""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with db_connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), now, now)
         )
+    job_runner.wake()
+    return job_id
 
-        worker_url = f"https://{worker_name}.signaturenorthwest.workers.dev"
 
-        # Update runtime config
-        CREATORS_CONFIG[name] = {
-            "of_us": of_url_us,
-            "of_de": of_url_de if of_url_de != of_url_us else None,
-            "has_dach": of_url_de != of_url_us
+def get_job(job_id):
+    with db_connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if not row:
+        return None
+
+    return {
+        'id': row['id'],
+        'kind': row['kind'],
+        'status': row['status'],
+        'steps': json.loads(row['steps']),
+        'result': json.loads(row['result']) if row['result'] else None,
+        'error': row['error'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+        'finished_at': row['finished_at'],
+    }
+
+
+class DeployJob:
+    """A claimed job; calling it with a step name records step-level progress"""
+
+    def __init__(self, job_id, kind, payload):
+        self.id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.steps = []
+        self.lock = threading.Lock()  # bulk deploys report from several threads
+
+    def __call__(self, step):
+        with self.lock:
+            self._finish_step('done')
+            self.steps.append({'step': step, 'status': 'running', 'started_at': time.time()})
+            self._save()
+
+    def count(self, completed, total):
+        """Record how many items of the running step are done (this also keeps the job from going stale)"""
+        with self.lock:
+            if self.steps:
+                self.steps[-1].update(completed=completed, total=total)
+            self._save()
+
+    def _finish_step(self, status):
+        if self.steps and self.steps[-1]['status'] == 'running':
+            self.steps[-1]['status'] = status
+            self.steps[-1]['finished_at'] = time.time()
+
+    def _save(self, **columns):
+        columns['steps'] = json.dumps(self.steps)
+        columns['updated_at'] = time.time()
+        assignments = ', '.join(f"{column} = ?" for column in columns)
+        with db_connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*columns.values(), self.id])
+
+    def run(self):
+        try:
+            result = JOB_HANDLERS[self.kind](self.payload, self)
+        except Exception as e:
+            self._finish_step('failed')
+            self._save(status='failed', error=str(e), finished_at=time.time())
+            return
+
+        self._finish_step('done')
+        status = 'succeeded' if result.get('success') else 'failed'
+        self._save(status=status, result=json.dumps(result), error=result.get('error'), finished_at=time.time())
+
+
+class JobRunner:
+    """Per-worker dispatcher thread that drains the jobs table"""
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pool = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.concurrency)
+                self.thread = threading.Thread(target=self._dispatch, name='job-runner', daemon=True)
+                self.thread.start()
+
+    def wake(self):
+        self.start()
+        self.wakeup.set()
+
+    def _claim(self):
+        """Atomically move the oldest runnable job to running, returns a DeployJob or None"""
+        now = time.time()
+        with db_connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, kind, payload FROM jobs"
+                " WHERE status = 'queued' OR (status = 'running' AND updated_at < ?)"
+                " ORDER BY created_at LIMIT 1",
+                (now - JOB_STALE_SECONDS,)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?", (now, row['id']))
+        return DeployJob(row['id'], row['kind'], json.loads(row['payload']))
+
+    def _dispatch(self):
+        while True:
+            self.slots.acquire()
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                job = None
+
+            if job is None:
+                self.slots.release()
+                self.wakeup.wait(JOB_POLL_INTERVAL)
+                self.wakeup.clear()
+                continue
+
+            self.pool.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            job.run()
+        finally:
+            self.slots.release()
+
+
+job_runner = JobRunner(JOB_CONCURRENCY)
+
+
+@app.before_request
+def start_job_runner():
+    # Started on the first request rather than at import, so it runs in each
+    # gunicorn worker but not in the image pool's child processes
+    job_runner.start()
+
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    """Report the status and step-level progress of a queued deploy job"""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+
+# ---------------------------------------------------------------------------
+# Click analytics
+#
+# The workers write one link_clicks row per click to Supabase. Rather than
+# scanning those on every dashboard request, new rows are pulled in id order
+# after a (timestamp, id) high-water mark and added to hourly rollups in the
+# local database; /api/stats only ever reads the rollups.
+# ---------------------------------------------------------------------------
+
+CLICK_ROLLUP_COLUMNS = "id,timestamp,model,tiktok_account,country,device_type,os,is_unique"
+
+# Response key -> rollup column for the /api/stats breakdowns
+STATS_BREAKDOWNS = {
+    'creators': 'creator',
+    'accounts': 'tiktok_account',
+    'countries': 'country',
+    'devices': 'device_type',
+    'os': 'os',
+}
+
+
+def click_rollup_key(row):
+    """Rollup dimensions for one link_clicks row: (hour, creator, account, country, device, os)"""
+    clicked_at = datetime.fromisoformat(row['timestamp'].replace('Z', '+00:00'))
+    model = row.get('model') or ''
+    # DACH clicks are logged as {creator}_de
+    creator = model[:-3] if model.endswith('_de') else model
+    return (
+        int(clicked_at.timestamp()) // 3600 * 3600,
+        creator,
+        row.get('tiktok_account') or '',
+        row.get('country') or '',
+        row.get('device_type') or '',
+        row.get('os') or '',
+    )
+
+
+def refresh_click_rollups(force=False):
+    """Fold clicks logged since the high-water mark into the hourly rollups
+
+    Returns the number of clicks folded in. Each page is applied in one
+    transaction together with the new high-water mark, so an interrupted
+    refresh resumes where it stopped and no click is counted twice.
+    """
+    now = time.time()
+    with db_connect() as conn:
+        # Claim the refresh so only one gunicorn worker pulls from Supabase at a time
+        claimed = conn.execute(
+            "UPDATE click_rollup_state SET refreshed_at = ? WHERE id = 1 AND refreshed_at <= ?",
+            (now, now if force else now - STATS_REFRESH_INTERVAL)
+        ).rowcount
+        state = conn.execute("SELECT high_water_ts, high_water_id FROM click_rollup_state WHERE id = 1").fetchone()
+    if not claimed:
+        return 0
+
+    high_ts, high_id = state['high_water_ts'], state['high_water_id']
+    settled = datetime.fromtimestamp(now - STATS_SETTLE_SECONDS, timezone.utc).isoformat()
+    folded = 0
+
+    for _ in range(STATS_REFRESH_MAX_PAGES):
+        params = [
+            ('select', CLICK_ROLLUP_COLUMNS),
+            ('timestamp', f"lte.{settled}"),
+            ('order', 'timestamp.asc,id.asc'),
+            ('limit', STATS_PAGE_SIZE),
+        ]
+        if high_ts:
+            params.append(('or', f"(timestamp.gt.{high_ts},and(timestamp.eq.{high_ts},id.gt.{high_id}))"))
+        resp = supabase_api.get("/rest/v1/link_clicks", params=params)
+        resp.raise_for_status()
+        rows = resp.json()
+        if not rows:
+            return folded
+
+        counts = {}
+        for row in rows:
+            totals = counts.setdefault(click_rollup_key(row), [0, 0])
+            totals[0] += 1
+            totals[1] += 1 if row.get('is_unique') else 0
+
+        with db_connect() as conn:
+            # Only advance from the mark we read, another worker may have got here first
+            advanced = conn.execute(
+                "UPDATE click_rollup_state SET high_water_ts = ?, high_water_id = ? "
+                "WHERE id = 1 AND high_water_ts IS ? AND high_water_id IS ?",
+                (rows[-1]['timestamp'], rows[-1]['id'], high_ts, high_id)
+            ).rowcount
+            if not advanced:
+                return folded
+            conn.executemany(
+                "INSERT INTO click_rollups (hour, creator, tiktok_account, country, device_type, os, clicks, uniques) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (hour, creator, tiktok_account, country, device_type, os) "
+                "DO UPDATE SET clicks = clicks + excluded.clicks, uniques = uniques + excluded.uniques",
+                [(*key, clicks, uniques) for key, (clicks, uniques) in counts.items()]
+            )
+
+        high_ts, high_id = rows[-1]['timestamp'], rows[-1]['id']
+        folded += len(rows)
+        if len(rows) < STATS_PAGE_SIZE:
+            return folded
+
+    # Page limit reached: let the next request carry on instead of waiting out the interval
+    with db_connect() as conn:
+        conn.execute("UPDATE click_rollup_state SET refreshed_at = 0 WHERE id = 1")
+    return folded
+
+
+def query_click_stats(since, until, bucket='hour', creator=None, tiktok_account=None):
+    """Aggregate the hourly rollups between two epoch hours (until exclusive)"""
+    bucket_seconds = 86400 if bucket == 'day' else 3600
+    where, params = ["hour >= ?", "hour < ?"], [since, until]
+    if creator:
+        where.append("creator = ?")
+        params.append(creator)
+    if tiktok_account:
+        where.append("tiktok_account = ?")
+        params.append(tiktok_account)
+    clause = " AND ".join(where)
+
+    with db_connect() as conn:
+        totals = conn.execute(
+            f"SELECT COALESCE(SUM(clicks), 0) AS clicks, COALESCE(SUM(uniques), 0) AS uniques FROM click_rollups WHERE {clause}",
+            params
+        ).fetchone()
+        series = conn.execute(
+            f"SELECT hour - hour % {bucket_seconds} AS bucket, SUM(clicks) AS clicks, SUM(uniques) AS uniques "
+            f"FROM click_rollups WHERE {clause} GROUP BY bucket ORDER BY bucket",
+            params
+        ).fetchall()
+        breakdowns = {
+            key: [dict(row) for row in conn.execute(
+                f"SELECT {column} AS value, SUM(clicks) AS clicks, SUM(uniques) AS uniques "
+                f"FROM click_rollups WHERE {clause} GROUP BY {column} ORDER BY clicks DESC",
+                params
+            )]
+            for key, column in STATS_BREAKDOWNS.items()
         }
+        high_water = conn.execute("SELECT high_water_ts FROM click_rollup_state WHERE id = 1").fetchone()[0]
 
-        # Create creator in Supabase database
+    return {
+        'clicks': totals['clicks'],
+        'uniques': totals['uniques'],
+        'series': [
+            {
+                'bucket': datetime.fromtimestamp(row['bucket'], timezone.utc).isoformat(),
+                'clicks': row['clicks'],
+                'uniques': row['uniques'],
+            }
+            for row in series
+        ],
+        **breakdowns,
+        'counted_through': high_water,
+    }
+
+
+def parse_stats_time(value, default):
+    """Parse an ISO date/datetime query param as UTC"""
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@app.route('/api/stats')
+@app.route('/api/stats/<creator>')
+def api_stats(creator=None):
+    """Clicks, uniques and breakdowns from the hourly rollups
+
+    Query params: `creator`, `tiktok_account`, `from` / `to` (ISO, default the
+    last STATS_DEFAULT_DAYS days), `bucket` (hour or day) and `refresh=1` to
+    pull new clicks before answering regardless of STATS_REFRESH_INTERVAL.
+    """
+    try:
+        creator = (creator or request.args.get('creator', '')).lower() or None
+        tiktok_account = normalize_handle(request.args.get('tiktok_account')) or None
+        bucket = request.args.get('bucket', 'hour')
+        if bucket not in ('hour', 'day'):
+            return jsonify({'success': False, 'error': 'bucket must be hour or day'})
+
+        until = parse_stats_time(request.args.get('to'), datetime.now(timezone.utc))
+        since = parse_stats_time(request.args.get('from'), until - timedelta(days=STATS_DEFAULT_DAYS))
+
+        response = {'success': True}
         if SUPABASE_SERVICE_KEY:
-            http_requests.post(
-                f"{SUPABASE_URL}/rest/v1/of_creators",
-                headers={
-                    "apikey": SUPABASE_SERVICE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=minimal"
-                },
-                json={
-                    "name": name.capitalize(),
-                    "account_prefix": name,
-                    "persona": "girlfriend",
-                    "is_active": True,
-                    "active_accounts_count": 0
-                }
+            try:
+                response['refreshed_clicks'] = refresh_click_rollups(force=request.args.get('refresh') in ('1', 'true'))
+            except Exception as e:
+                # Serve what's already rolled up rather than failing the dashboard
+                response['refresh_error'] = str(e)
+
+        # Round out to whole hours so partial hours at either end are included
+        stats = query_click_stats(
+            int(since.timestamp()) // 3600 * 3600,
+            -(-int(until.timestamp()) // 3600) * 3600,
+            bucket, creator, tiktok_account
+        )
+        return jsonify({**response, **stats})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    provider_deadline.set(time.monotonic() + REQUEST_PROVIDER_DEADLINE)
+
+
+@app.teardown_request
+def clear_provider_deadline(exc):
+    # The thread serves other things between requests, which have no deadline
+    provider_deadline.set(None)
+
+
+@app.after_request
+def observe_request_time(response):
+    """Time each endpoint until its response is fully sent (streamed ones included)"""
+    started = g.get('request_started')
+    if started is not None and request.endpoint not in (None, 'metrics_endpoint'):
+        endpoint, method, status = request.endpoint, request.method, response.status_code
+        response.call_on_close(lambda: metrics.observe(
+            'http_request_seconds', time.perf_counter() - started, endpoint=endpoint, method=method, status=status
+        ))
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Timing histograms of every gunicorn worker in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/health')
+def health():
+    return jsonify({'status': 'ok'})
+
+
+# ---------------------------------------------------------------------------
+# Async (ASGI) mode
+#
+# `uvicorn app:asgi_app` serves the same app from one event loop. The deploy
+# endpoints below run the same deploy coroutines as their Flask views, given
+# event_loop_io instead of blocking_io: provider calls go through httpx
+# (AsyncProviderClient), so a request waiting on Netlify or Cloudflare holds
+# no thread, independent calls are awaited together, and SQLite and image
+# processing run in the default executor. Every other route is the Flask
+# view, run by asgiref's WsgiToAsgi on its thread pool. `gunicorn app:app`
+# is unchanged.
+# ---------------------------------------------------------------------------
+
+async def iter_redeploy_results_async(creators, force=False):
+    """iter_redeploy_results() for the ASGI mode: uploads are tasks, REDEPLOY_CONCURRENCY at a time"""
+    slots = asyncio.Semaphore(REDEPLOY_CONCURRENCY)
+
+    async def run(step):
+        async with slots:
+            return await step
+
+    for next_result in asyncio.as_completed([run(step) for step in await redeploy_worker_steps(event_loop_io, creators, force)]):
+        yield await next_result
+
+
+ASYNC_VIEWS = {}
+
+
+def async_view(path):
+    """Serve POSTs to path with this coroutine in the ASGI mode (the Flask view stays for WSGI)"""
+    def register(view):
+        ASYNC_VIEWS[path] = view
+        return view
+    return register
+
+
+@async_view('/api/deploy-netlify')
+@reports_peak_memory
+async def api_deploy_netlify_async():
+    """api_deploy_netlify() for the ASGI mode"""
+    try:
+        data = read_deploy_request()
+        creator, handle, background = netlify_deploy_params(data)
+
+        if wants_async(data):
+            return jsonify(await event_loop_io.blocking(enqueue_netlify_deploy, creator, handle, background))
+
+        return jsonify(await run_netlify_deploy_io(event_loop_io, creator, handle, background))
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+@async_view('/api/deploy-worker')
+async def api_deploy_worker_async():
+    """api_deploy_worker() for the ASGI mode"""
+    try:
+        data = request.get_json()
+        name, of_url_us, of_url_de = worker_deploy_params(data)
+
+        if wants_async(data):
+            job_id = await event_loop_io.blocking(
+                enqueue_job, 'deploy-worker', {'name': name, 'of_url_us': of_url_us, 'of_url_de': of_url_de}
             )
+            return jsonify({'success': True, 'job_id': job_id, 'status_url': f"/api/jobs/{job_id}"})
 
-        return jsonify({
-            'success': True,
-            'worker_url': worker_url,
-            'worker_name': worker_name
-        })
+        return jsonify(await deploy_worker_io(event_loop_io, name, of_url_us, of_url_de))
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 
-@app.route('/api/redeploy-all-workers', methods=['POST'])
-def api_redeploy_all_workers():
-    """Redeploy all creator workers with the latest worker code"""
+@async_view('/api/redeploy-all-workers')
+async def api_redeploy_all_workers_async():
+    """api_redeploy_all_workers() for the ASGI mode"""
     if not CLOUDFLARE_API_TOKEN:
         return jsonify({'success': False, 'error': 'CLOUDFLARE_API_TOKEN not configured'})
+    try:
+        # The creator registry is read from SQLite, off the event loop
+        selected, force = await event_loop_io.blocking(redeploy_params)
+    except DeployError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    creators = await event_loop_io.blocking(redeploy_creators, selected)
+    started = time.monotonic()
 
-    import json as json_lib
+    if request.args.get('stream') in ('1', 'true'):
+        async def generate():
+            results = []
+            async for result in iter_redeploy_results_async(creators, force):
+                results.append(result)
+                yield json.dumps(result) + "\n"
+            yield json.dumps({'done': True, **redeploy_summary(results, started)}) + "\n"
 
-    results = []
-    for creator_name, config in CREATORS_CONFIG.items():
-        worker_name = config.get('worker') or f"{creator_name}2"
-        of_url_us = config.get('of_us', '')
-        of_url_de = config.get('of_de') or of_url_us
+        return Response(generate(), mimetype='application/x-ndjson')
 
-        if not of_url_us:
-            results.append({'creator': creator_name, 'success': False, 'error': 'no of_url_us'})
-            continue
+    results = sorted_redeploy_results(creators, [result async for result in iter_redeploy_results_async(creators, force)])
+
+    return jsonify({**redeploy_summary(results, started), 'results': results})
+
+
+def asgi_environ(scope, body):
+    """WSGI environ for an ASGI http scope, so Flask parses the request as usual"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
 
-        worker_code = generate_worker_code(creator_name, of_url_us, of_url_de)
-        metadata = {"main_module": "worker.js", "compatibility_date": "2024-01-01"}
 
+class AsgiApp:
+    """ASGI entry point: the async views on the event loop, every other route via Flask
+
+    Async views run inside a Flask request context, so they parse requests,
+    build responses and get the before/after_request hooks (CORS, request
+    timing) exactly like the WSGI views. A view may return a Response whose
+    body is an async generator, which is streamed.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        view = ASYNC_VIEWS.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'POST' else None
+        if view is None:
+            return await self.wsgi(scope, receive, send)
+
+        # Spooled like werkzeug does, so a large upload isn't held in memory
+        body = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
         try:
-            resp = http_requests.put(
-                f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/workers/scripts/{worker_name}",
-                headers={"Authorization": f"Bearer {CLOUDFLARE_API_TOKEN}"},
-                files={
-                    "worker.js": ("worker.js", worker_code, "application/javascript+module"),
-                    "metadata": ("metadata.json", json_lib.dumps(metadata), "application/json")
-                }
-            )
-            success = resp.json().get('success', False)
-            results.append({'creator': creator_name, 'worker': worker_name, 'success': success})
-        except Exception as e:
-            results.append({'creator': creator_name, 'worker': worker_name, 'success': False, 'error': str(e)})
+            while True:
+                message = await receive()
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
 
-    all_ok = all(r['success'] for r in results)
-    return jsonify({'success': all_ok, 'results': results})
+            with self.flask_app.request_context(asgi_environ(scope, body)):
+                response = self.flask_app.preprocess_request()
+                if response is None:
+                    response = await view()
+                response = self.flask_app.process_response(self.flask_app.make_response(response))
+                await self.send_response(response, send)
+        finally:
+            body.close()
 
+    async def send_response(self, response, send):
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()],
+        })
+        try:
+            if hasattr(response.response, '__aiter__'):
+                async for chunk in response.response:
+                    await send({'type': 'http.response.body', 'body': chunk.encode() if isinstance(chunk, str) else chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+            else:
+                await send({'type': 'http.response.body', 'body': response.get_data()})
+        finally:
+            response.close()
 
-@app.route('/health')
-def health():
-    return jsonify({'status': 'ok'})
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for client in (netlify_async, cloudflare_async, supabase_async):
+                    await client.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+asgi_app = AsgiApp(app)
 
 
 if __name__ == '__main__':
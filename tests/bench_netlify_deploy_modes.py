@@ -0,0 +1,66 @@
+"""Time digest, zip and auto deploys of tt-{handle} sites against a fake Netlify
+
+    python tests/bench_netlify_deploy_modes.py [--rtt 0.04] [--bandwidth 20e6]
+
+Each mode starts from an empty fake Netlify and local database, processes one
+3000x2000 background and deploys three pages with it: a new handle, a second
+handle (the background's digests are known by then) and the first handle again
+unchanged. Reports Netlify round trips and wall time per deploy; image
+processing is done once up front and not included.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="link-setup-bench-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+import app  # noqa: E402
+from fake_providers import FakeNetlify  # noqa: E402
+
+
+def background_image():
+    buf = io.BytesIO()
+    Image.effect_noise((3000, 2000), 60).convert("RGB").save(buf, "JPEG")
+    return app.compress_background_image(buf.getvalue())
+
+
+def run_mode(mode, image, rtt, bandwidth):
+    """[(handle, round trips, milliseconds)] of the three deploys in one mode"""
+    app.NETLIFY_DEPLOY_MODE = mode
+    app.DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix=f"{mode}-", dir=app.DATA_DIR), "link-setup.db")
+    app._schema_ready = False
+
+    results = []
+    with FakeNetlify(latency=rtt, bandwidth=bandwidth) as fake:
+        app.netlify_api.base_url = fake.api_url
+        for handle in ("one", "two", "one"):
+            html = app.generate_netlify_html("https://miri2.example.workers.dev", handle, image=image)
+            started = time.perf_counter()
+            deploy = app.deploy_netlify_site(handle, html, image)
+            results.append((handle, deploy['deploy_mode'], deploy['round_trips'],
+                            round((time.perf_counter() - started) * 1000)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rtt", type=float, default=0.04, help="seconds added to every request")
+    parser.add_argument("--bandwidth", type=float, default=20e6, help="upload bytes/second")
+    args = parser.parse_args()
+
+    image = background_image()
+    print(f"{len(image.files)} image files, {sum(len(f.data) for f in image.files) / 1e6:.1f} MB")
+    for mode in ("digest", "zip", "auto"):
+        results = run_mode(mode, image, args.rtt, args.bandwidth)
+        print(f"{mode:7}" + " | ".join(f"{handle}: {used} {trips} round trips {ms} ms"
+                                       for handle, used, trips, ms in results))
+
+
+if __name__ == "__main__":
+    main()
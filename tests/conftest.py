@@ -0,0 +1,34 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py creates its SQLite database and caches under DATA_DIR at import time
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="link-setup-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from fake_providers import FakeNetlify  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(monkeypatch):
+    """An emptied local database, with a creator registry that seeds it again
+
+    Emptied in place rather than swapped for a new file, since the job runner
+    and metrics threads keep using the database in the background.
+    """
+    with app.db_connect() as conn:
+        for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            conn.execute(f"DELETE FROM {table}")
+        conn.executescript(app.DATABASE_SCHEMA)
+    monkeypatch.setattr(app, "creator_registry", app.CreatorRegistry(app.creator_registry.seed))
+
+
+@pytest.fixture
+def fake_netlify(fresh_db, monkeypatch):
+    """A FakeNetlify behind app.netlify_api"""
+    with FakeNetlify() as fake:
+        monkeypatch.setattr(app.netlify_api, "base_url", fake.api_url)
+        yield fake
@@ -0,0 +1,295 @@
+"""Local stand-ins for the Netlify and Cloudflare APIs, optionally enforcing a rate-limit quota
+
+FakeNetlify serves the endpoints app.py calls (sites, digest and ZIP deploys,
+file uploads, deploy status) from memory over real HTTP, so requests go through
+the ProviderClient's session, urllib3 retries and RateLimiter exactly like in
+production. Every request is recorded, and a Quota makes it answer 429s with
+Retry-After and X-RateLimit-* headers once a fixed window's budget is spent.
+"""
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+class Quota:
+    """Fixed-window quota: limit calls per window seconds, 429 once it's spent"""
+
+    def __init__(self, limit, window, headers=True):
+        self.limit = limit
+        self.window = window
+        self.headers = headers  # send X-RateLimit-*, like Netlify; Retry-After is always sent
+        self.started = time.time()
+        self.used = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def check(self):
+        """(allowed, response headers) for one call"""
+        with self.lock:
+            now = time.time()
+            if now - self.started >= self.window:
+                self.started, self.used = now, 0
+            reset = self.started + self.window
+            allowed = self.used < self.limit
+            if allowed:
+                self.used += 1
+                self.accepted += 1
+            else:
+                self.rejected += 1
+            headers = {} if allowed else {'Retry-After': str(max(1, int(reset - now + 0.999)))}
+            if self.headers:
+                headers.update({
+                    'X-RateLimit-Limit': str(self.limit),
+                    'X-RateLimit-Remaining': str(self.limit - self.used),
+                    'X-RateLimit-Reset': str(int(reset + 0.999)),
+                })
+            return allowed, headers
+
+
+class FakeNetlify:
+    """In-memory Netlify API at self.url + '/api/v1'
+
+    latency adds a fixed delay per request plus the time the body takes at
+    bandwidth bytes/second, for timing comparisons against a remote API.
+    """
+
+    def __init__(self, quota=None, latency=0.0, bandwidth=None):
+        self.quota = quota
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.lock = threading.Lock()
+        self.sites = {}  # name -> id
+        self.taken = set()  # site names other accounts hold
+        self.site_files = {}  # site id -> path -> sha1 of its last deploy
+        self.deploys = {}  # id -> {'site_id', 'files', 'required', 'state'}
+        self.blobs = set()  # sha1s uploaded to any deploy
+        self.uploads = 0
+        self.fail_upload = None  # answer the file upload with this number (1-based) with a 400
+        self.requests = []  # (method, path), 429s included
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def api_url(self):
+        return self.url + '/api/v1'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, method, pattern):
+        """Requests whose method matches and path matches the regex pattern"""
+        return sum(1 for m, path in self.requests if m == method and re.search(pattern, path))
+
+    def create_deploy(self, site_id, files):
+        with self.lock:
+            deploy_id = f"deploy-{len(self.deploys) + 1}"
+            required = sorted({sha1 for sha1 in files.values() if sha1 not in self.blobs})
+            self.deploys[deploy_id] = {
+                'site_id': site_id, 'files': files, 'required': set(required),
+                'state': 'prepared' if required else 'ready',
+            }
+            if not required:
+                self.site_files[site_id] = files
+        return {'id': deploy_id, 'site_id': site_id, 'state': self.deploys[deploy_id]['state'], 'required': required}
+
+    def upload(self, deploy_id, data):
+        sha1 = hashlib.sha1(data).hexdigest()
+        with self.lock:
+            deploy = self.deploys[deploy_id]
+            self.blobs.add(sha1)
+            deploy['required'].discard(sha1)
+            if not deploy['required']:
+                deploy['state'] = 'ready'
+                self.site_files[deploy['site_id']] = deploy['files']
+
+    def handle(self, method, path, query, headers, body):
+        """(status, JSON body) for one API call"""
+        if method == 'POST' and path == '/sites':
+            name = json.loads(body)['name']
+            with self.lock:
+                if name in self.sites or name in self.taken:
+                    return 422, {'errors': {'subdomain': ['must be unique']}}
+                self.sites[name] = f"site-{name}"
+            return 201, {'id': self.sites[name], 'name': name}
+
+        if method == 'GET' and path == '/sites':
+            name = query.get('name', [''])[0]
+            # Like Netlify: a substring match, most recently created first
+            matches = [(n, i) for n, i in reversed(self.sites.items()) if name in n]
+            per_page = int(query.get('per_page', ['100'])[0])
+            page = int(query.get('page', ['1'])[0])
+            return 200, [{'id': i, 'name': n} for n, i in matches[(page - 1) * per_page:page * per_page]]
+
+        match = re.fullmatch(r'/sites/([^/]+)/deploys', path)
+        if method == 'POST' and match:
+            site_id = match.group(1)
+            if site_id not in self.sites.values():
+                return 404, {'message': 'Not Found'}
+            if headers.get('Content-Type') == 'application/zip':
+                with zipfile.ZipFile(io.BytesIO(body)) as archive:
+                    contents = {'/' + name: archive.read(name) for name in archive.namelist()}
+                with self.lock:
+                    self.blobs.update(hashlib.sha1(data).hexdigest() for data in contents.values())
+                return 200, self.create_deploy(
+                    site_id, {path: hashlib.sha1(data).hexdigest() for path, data in contents.items()}
+                )
+            return 200, self.create_deploy(site_id, json.loads(body)['files'])
+
+        match = re.fullmatch(r'/sites/([^/]+)/files', path)
+        if method == 'GET' and match:
+            if match.group(1) not in self.sites.values():
+                return 404, {'message': 'Not Found'}
+            files = self.site_files.get(match.group(1), {})
+            return 200, [{'id': path, 'path': path, 'sha': sha1} for path, sha1 in files.items()]
+
+        match = re.fullmatch(r'/deploys/([^/]+)/files/.+', path)
+        if method == 'PUT' and match:
+            if match.group(1) not in self.deploys:
+                return 404, {'message': 'Not Found'}
+            with self.lock:
+                self.uploads += 1
+                failing = self.uploads == self.fail_upload
+            if failing:
+                return 400, {'message': 'Upload failed'}
+            self.upload(match.group(1), body)
+            return 200, {}
+
+        match = re.fullmatch(r'/deploys/([^/]+)', path)
+        if method == 'GET' and match:
+            deploy = self.deploys.get(match.group(1))
+            if deploy is None:
+                return 404, {'message': 'Not Found'}
+            return 200, {'id': match.group(1), 'site_id': deploy['site_id'], 'state': deploy['state']}
+
+        return 404, {'message': 'Not Found'}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def respond(self, method):
+                parts = urlsplit(self.path)
+                path = unquote(parts.path)[len('/api/v1'):]
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with fake.lock:
+                    fake.requests.append((method, path))
+                if fake.latency or fake.bandwidth:
+                    time.sleep(fake.latency + (len(body) / fake.bandwidth if fake.bandwidth else 0))
+
+                allowed, headers = fake.quota.check() if fake.quota else (True, {})
+                if allowed:
+                    status, result = fake.handle(method, path, parse_qs(parts.query), self.headers, body)
+                else:
+                    status, result = 429, {'message': 'Rate limit exceeded'}
+                payload = json.dumps(result).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self.respond('GET')
+
+            def do_POST(self):
+                self.respond('POST')
+
+            def do_PUT(self):
+                self.respond('PUT')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class FakeCloudflare:
+    """In-memory Cloudflare Workers API at self.api_url, for worker script deploys
+
+    scripts maps a worker name to the raw multipart body of its last upload.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scripts = {}
+        self.requests = []  # (method, path)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def api_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/client/v4/accounts/test"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def uploads(self):
+        """Names of the worker scripts uploaded, in order"""
+        return [path.split('/')[-1] for method, path in self.requests
+                if method == 'PUT' and re.fullmatch(r'/workers/scripts/[^/]+', path)]
+
+    def handle(self, method, path, body):
+        match = re.fullmatch(r'/workers/scripts/([^/]+)', path)
+        if method == 'PUT' and match:
+            with self.lock:
+                self.scripts[match.group(1)] = body
+            return 200, {'success': True, 'result': {'id': match.group(1)}}
+        match = re.fullmatch(r'/workers/scripts/([^/]+)/(secrets|subdomain)', path)
+        if match and match.group(1) in self.scripts:
+            return 200, {'success': True, 'result': {}}
+        return 404, {'success': False, 'errors': [{'message': 'Not Found'}]}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def respond(self, method):
+                path = unquote(urlsplit(self.path).path).split('/accounts/test', 1)[-1]
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with fake.lock:
+                    fake.requests.append((method, path))
+                status, result = fake.handle(method, path, body)
+                payload = json.dumps(result).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                self.respond('POST')
+
+            def do_PUT(self):
+                self.respond('PUT')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
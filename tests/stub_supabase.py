@@ -0,0 +1,177 @@
+"""Minimal PostgREST stand-in for the link_clicks endpoints
+
+Serves the subset generated workers and the stats refresh use from memory:
+reads with select=, column filters (eq, gt, gte, lt, lte, in), or=(...) with
+nested and(...), order= and limit=, plus inserts, log_click and log_clicks. It
+counts requests and inserted rows, so the number of Supabase subrequests per
+click can be measured without a real project.
+"""
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubSupabase:
+    """In-memory link_clicks table behind a local HTTP server"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = []
+        self.fingerprints = set()
+        self.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def insert(self, row):
+        """Add a row with the id and timestamp defaults link_clicks has"""
+        self.rows.append({
+            'id': len(self.rows) + 1,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            **row,
+        })
+
+    def select(self, query):
+        """Rows for a PostgREST read, see the module docstring for what is understood"""
+        rows = [row for row in self.rows if all(
+            matches(row, f"{column}.{value}") if column != 'or' else any_of(row, value)
+            for column, values in query.items() if column not in ('select', 'order', 'limit')
+            for value in values
+        )]
+        for key in reversed(query.get('order', [''])[0].split(',')):
+            if key:
+                column, _, direction = key.partition('.')
+                rows.sort(key=lambda row: sort_key(row.get(column)), reverse=direction == 'desc')
+        if 'limit' in query:
+            rows = rows[:int(query['limit'][0])]
+        columns = query.get('select', ['*'])[0]
+        if columns != '*':
+            rows = [{column: row.get(column) for column in columns.split(',')} for row in rows]
+        return rows
+
+    def log_click(self, payload):
+        """What the log_click() SQL function does: claim the fingerprint, insert the click"""
+        is_new = payload.get('fingerprint_hash') not in self.fingerprints
+        self.fingerprints.add(payload.get('fingerprint_hash'))
+        self.insert({**payload, 'is_unique': is_new})
+        return is_new
+
+    def handle(self, method, path, query, body):
+        with self.lock:
+            self.requests.append((method, path))
+            if method == 'GET' and path == '/rest/v1/link_clicks':
+                return self.select(query)
+            if method == 'POST' and path == '/rest/v1/link_clicks':
+                rows = body if isinstance(body, list) else [body]
+                for row in rows:
+                    self.insert(row)
+                self.fingerprints.update(row.get('fingerprint_hash') for row in rows)
+                return None
+            if method == 'POST' and path == '/rest/v1/rpc/log_click':
+                return self.log_click(body['payload'])
+            if method == 'POST' and path == '/rest/v1/rpc/log_clicks':
+                return sum(self.log_click(payload) for payload in body['payloads'])
+            raise KeyError(path)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def respond(self, method):
+                parts = urlsplit(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                try:
+                    result = stub.handle(method, parts.path, parse_qs(parts.query), body)
+                except KeyError:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                payload = b'' if result is None else json.dumps(result).encode()
+                self.send_response(201 if result is None else 200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self.respond('GET')
+
+            def do_POST(self):
+                self.respond('POST')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def sort_key(value):
+    """Order values like Postgres would: timestamps by time, numbers by value, NULLs last"""
+    if value is None:
+        return (2, 0)
+    if isinstance(value, str):
+        try:
+            return (0, datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+        except ValueError:
+            return (1, value)
+    return (0, value)
+
+
+def compare(value, operand):
+    """-1/0/1 of a row value against a filter operand (text in the query string)"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        operand = operand == 'true'
+    elif isinstance(value, (int, float)):
+        operand = type(value)(operand)
+    else:
+        value, operand = sort_key(value), sort_key(operand)
+    return (value > operand) - (value < operand)
+
+
+def matches(row, condition):
+    """Whether row passes one column.op.value condition"""
+    column, op, operand = condition.split('.', 2)
+    if op == 'in':
+        return str(row.get(column)) in operand.strip('()').split(',')
+    result = compare(row.get(column), operand)
+    if result is None:
+        return op == 'is' and operand == 'null'
+    return {'eq': result == 0, 'gt': result > 0, 'gte': result >= 0, 'lt': result < 0, 'lte': result <= 0}[op]
+
+
+def split_conditions(text):
+    """Top-level comma-separated parts of an or=/and() list"""
+    parts, depth, current = [], 0, ''
+    for char in text:
+        if char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        current += char
+    return parts + [current]
+
+
+def any_of(row, conditions):
+    """or=(a,b,and(c,d)) for one row"""
+    return any(
+        all(matches(row, part) for part in split_conditions(condition[4:-1])) if condition.startswith('and(')
+        else matches(row, condition)
+        for condition in split_conditions(conditions[1:-1])
+    )
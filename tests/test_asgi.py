@@ -0,0 +1,83 @@
+"""The ASGI mode's deploy endpoints, against the fake Netlify"""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import app
+
+BACKGROUND = {"type": "url", "url": "https://assets-miriam.netlify.app/background.jpg"}
+
+
+@pytest.fixture
+def asgi(fake_netlify, monkeypatch):
+    """post(path, **kwargs) through app.asgi_app, with SQLite off limits on the event loop thread"""
+    monkeypatch.setattr(app, "NETLIFY_API_TOKEN", "test-token")
+    monkeypatch.setattr(app, "NETLIFY_CONSOLIDATED_SITES", False)
+    loop_threads = set()
+    db_connect = app.db_connect
+
+    def guarded_db_connect():
+        assert threading.get_ident() not in loop_threads, "SQLite call on the event loop"
+        return db_connect()
+
+    monkeypatch.setattr(app, "db_connect", guarded_db_connect)
+
+    def post(path, **kwargs):
+        async def run():
+            loop_threads.add(threading.get_ident())
+            try:
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.asgi_app), base_url="http://test") as client:
+                    return await client.post(path, **kwargs)
+            finally:
+                loop_threads.clear()
+                await app.netlify_async.aclose()  # its connections belong to this loop
+
+        return asyncio.run(run())
+    return post
+
+
+def test_connection_pool_is_sized_on_the_transport():
+    async def pool():
+        try:
+            return app.netlify_async.session()._transport._pool
+        finally:
+            await app.netlify_async.aclose()
+
+    assert asyncio.run(pool())._max_keepalive_connections == app.HTTP_POOL_SIZE
+
+
+def test_deploy_matches_the_wsgi_view(asgi, fake_netlify, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "digest")
+    request = {"creator": "miriam", "handle": "alpha", "background": BACKGROUND}
+    body = asgi("/api/deploy-netlify?memory=1", json=request).json()
+
+    assert body['success'], body
+    assert (body['deploy_mode'], body['round_trips']) == ('digest', 4)
+    assert body['peak_memory_bytes'] > 0
+    assert app.serving_site_id("alpha") == "site-tt-alpha"
+
+    wsgi = app.app.test_client().post("/api/deploy-netlify", json={**request, "handle": "beta"}).get_json()
+    assert set(wsgi) == set(body) - {'peak_memory_bytes'}
+
+
+def test_zip_deploy_sends_the_archive(asgi, fake_netlify, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "zip")
+    body = asgi("/api/deploy-netlify", json={"creator": "miriam", "handle": "alpha", "background": BACKGROUND}).json()
+
+    assert (body['deploy_mode'], body['round_trips']) == ('zip', 3)
+    assert list(fake_netlify.site_files["site-tt-alpha"]) == ["/index.html"]
+
+
+def test_failed_upload_resumes(asgi, fake_netlify, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "digest")
+    fake_netlify.fail_upload = 1
+    request = {"creator": "miriam", "handle": "alpha", "background": BACKGROUND}
+
+    failed = asgi("/api/deploy-netlify", json=request).json()
+    retried = asgi("/api/deploy-netlify", json=request).json()
+
+    assert not failed['success']
+    assert retried['success'] and retried['resumed']
+    assert fake_netlify.count("POST", r"/deploys$") == 1
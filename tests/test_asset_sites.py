@@ -0,0 +1,102 @@
+"""Backgrounds hosted on a creator's asset site, against the fake Netlify"""
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+import app
+
+
+def background(seed):
+    buf = io.BytesIO()
+    Image.effect_noise((1200, 800), 40 + seed).convert("RGB").save(buf, "JPEG")
+    return app.compress_background_image(buf.getvalue())
+
+
+@pytest.fixture(scope="module")
+def images():
+    return background(1), background(2)
+
+
+def uploads(fake):
+    return fake.count("PUT", r"^/deploys/")
+
+
+def test_first_background_goes_up_as_one_zip(fake_netlify, images, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "auto")
+    first, second = images
+
+    url, _ = app.host_creator_background("miriam", first)
+    assert uploads(fake_netlify) == 0
+    assert url.startswith("https://assets-miriam.netlify.app/")
+
+    # The next one has to keep the first on the site, so it's a digest deploy of its own files
+    app.host_creator_background("miriam", second)
+    assert uploads(fake_netlify) == len(second.files)
+    assert len(fake_netlify.site_files["site-assets-miriam"]) == len(first.files) + len(second.files)
+    assert app.creator_registry.get("miriam")["background"].endswith("/background.jpg")
+
+
+def test_failed_upload_resumes(fake_netlify, images, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "digest")
+    first, _ = images
+    fake_netlify.fail_upload = 4
+
+    with pytest.raises(app.DeployError):
+        app.host_creator_background("miriam", first)
+    deploys_before = fake_netlify.count("POST", r"/deploys$")
+    app.host_creator_background("miriam", first)
+
+    # The retry reuses the open deploy and only sends the failed file and the ones after it
+    assert fake_netlify.count("POST", r"/deploys$") == deploys_before
+    assert uploads(fake_netlify) == 3 + 1 + (len(first.files) - 3)
+    assert len(fake_netlify.site_files["site-assets-miriam"]) == len(first.files)
+
+
+def test_earlier_backgrounds_survive_a_new_database(fake_netlify, images, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "digest")
+    first, second = images
+    first_url, _ = app.host_creator_background("miriam", first)
+
+    with app.db_connect() as conn:
+        conn.execute("DELETE FROM asset_images")
+        conn.execute("DELETE FROM asset_sites")
+    app.host_creator_background("miriam", second)
+
+    hosted = fake_netlify.site_files["site-assets-miriam"]
+    assert len(hosted) == len(first.files) + len(second.files)
+    assert "/" + first_url.split("/", 3)[3] in hosted
+
+
+def test_page_ships_the_background_when_the_asset_site_fails(fake_netlify, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "digest")
+    fake_netlify.fail_upload = 1
+    buf = io.BytesIO()
+    Image.effect_noise((1200, 800), 41).convert("RGB").save(buf, "JPEG")
+    upload = {"type": "upload", "data": base64.b64encode(buf.getvalue()).decode()}
+    stats = {}
+
+    url, image = app.prepare_background(upload, stats, creator="miriam")
+
+    assert url == "background.jpg"
+    assert image.files and "Failed" in stats["asset_site_error"]
+    result = app.deploy_handle("miriam", "alpha", url, image)
+    assert set(fake_netlify.site_files[result['site_id']]) == {"/index.html"} | {f.path for f in image.files}
+
+
+def test_existing_asset_site_found_by_exact_name(fake_netlify, images, monkeypatch):
+    # No index row for mira, and the name lookup lists the newer assets-mirabel first
+    fake_netlify.sites.update({"assets-mira": "site-assets-mira", "assets-mirabel": "site-assets-mirabel"})
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "digest")
+
+    url, _ = app.host_creator_background("mira", images[0])
+
+    assert url.startswith("https://assets-mira.netlify.app/")
+    assert "site-assets-mira" in fake_netlify.site_files
+    assert "site-assets-mirabel" not in fake_netlify.site_files
+
+
+def test_asset_site_lock_is_per_creator():
+    assert app._asset_site_locks("miriam") is app._asset_site_locks("miriam")
+    assert app._asset_site_locks("miriam") is not app._asset_site_locks("suki")
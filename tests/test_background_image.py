@@ -0,0 +1,35 @@
+"""compress_background_image() across the image modes VAs upload"""
+import io
+
+import pytest
+from PIL import Image
+
+import app
+
+
+def encoded(mode, image_format):
+    img = Image.effect_noise((2000, 500), 60).convert(mode)
+    buf = io.BytesIO()
+    img.save(buf, image_format)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("mode, image_format", [
+    ("RGB", "JPEG"),
+    ("CMYK", "JPEG"),
+    ("L", "JPEG"),
+    ("L", "PNG"),
+    ("1", "PNG"),
+    ("P", "PNG"),
+    ("LA", "PNG"),
+    ("RGBA", "PNG"),
+    ("I", "PNG"),
+])
+def test_every_mode_yields_a_background(mode, image_format):
+    image = app.compress_background_image(encoded(mode, image_format))
+
+    paths = [f.path for f in image.files]
+    assert paths[:2] == ["/background.jpg", "/background.webp"]
+    full = Image.open(io.BytesIO(image.files[0].data))
+    assert full.width == app.BACKGROUND_MAX_WIDTH and full.mode in ("RGB", "L")
+    assert image.placeholder.startswith("data:image/jpeg;base64,")
@@ -0,0 +1,77 @@
+"""Incremental click rollups and /api/stats, against a stub Supabase"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app
+from stub_supabase import StubSupabase
+
+HOUR = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+
+
+def click(model, minute, country="DE", unique=True):
+    return {
+        "timestamp": (HOUR + timedelta(minutes=minute)).isoformat(),
+        "model": model, "tiktok_account": "anna", "country": country,
+        "device_type": "mobile", "os": "ios", "is_unique": unique,
+    }
+
+
+@pytest.fixture
+def supabase(fresh_db, monkeypatch):
+    """A StubSupabase behind app.supabase_api, read three rows per page"""
+    with StubSupabase() as stub:
+        monkeypatch.setattr(app.supabase_api, "base_url", stub.url)
+        monkeypatch.setattr(app, "SUPABASE_SERVICE_KEY", "test-key")
+        monkeypatch.setattr(app, "STATS_PAGE_SIZE", 3)
+        yield stub
+
+
+def reads(stub):
+    return sum(1 for method, path, *_ in stub.requests if method == "GET")
+
+
+def test_refresh_pages_through_every_settled_click(supabase):
+    # Several clicks share a timestamp, so pages have to break ties on id
+    for minute in (0, 0, 0, 5, 5, 70, 70):
+        supabase.insert(click("miriam", minute))
+    supabase.insert(click("miriam", 80, unique=False))
+    supabase.insert({**click("miriam", 0), "timestamp": datetime.now(timezone.utc).isoformat()})
+
+    assert app.refresh_click_rollups(force=True) == 8
+    assert reads(supabase) == 3
+    with app.db_connect() as conn:
+        hours = conn.execute("SELECT hour, clicks, uniques FROM click_rollups ORDER BY hour").fetchall()
+    start = int(HOUR.timestamp())
+    assert [tuple(row) for row in hours] == [(start, 5, 5), (start + 3600, 3, 2)]
+
+
+def test_second_refresh_folds_nothing(supabase):
+    for minute in range(7):
+        supabase.insert(click("miriam", minute))
+
+    assert app.refresh_click_rollups(force=True) == 7
+    assert app.refresh_click_rollups(force=True) == 0
+
+    supabase.insert(click("miriam", 30))
+    assert app.refresh_click_rollups(force=True) == 1
+    with app.db_connect() as conn:
+        assert conn.execute("SELECT SUM(clicks) FROM click_rollups").fetchone()[0] == 8
+
+
+def test_stats_merge_dach_clicks_into_the_creator(supabase):
+    supabase.insert(click("miriam", 1))
+    supabase.insert(click("miriam_de", 2, country="AT"))
+    supabase.insert(click("miriam_de", 3, country="CH", unique=False))
+    supabase.insert(click("anna", 4))
+
+    body = app.app.test_client().get("/api/stats?refresh=1").get_json()
+
+    assert body["success"] and body["refreshed_clicks"] == 4
+    assert (body["clicks"], body["uniques"]) == (4, 3)
+    assert body["creators"] == [
+        {"value": "miriam", "clicks": 3, "uniques": 2},
+        {"value": "anna", "clicks": 1, "uniques": 1},
+    ]
+    miriam = app.app.test_client().get("/api/stats/miriam").get_json()
+    assert {row["value"] for row in miriam["countries"]} == {"DE", "AT", "CH"}
@@ -0,0 +1,90 @@
+"""Moving handles onto a creator's consolidated site, and back off it"""
+import pytest
+
+import app
+
+BACKGROUND = "https://assets-miriam.netlify.app/background.jpg"
+
+
+def site_deploys(fake, site_id):
+    return fake.count("POST", rf"^/sites/{site_id}/deploys$")
+
+
+def test_moved_handle_keeps_its_own_site(fake_netlify, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_CONSOLIDATED_SITES", False)
+    app.deploy_handle("miriam", "alpha", BACKGROUND)
+
+    monkeypatch.setattr(app, "NETLIFY_CONSOLIDATED_SITES", True)
+    moved = app.deploy_handle("miriam", "alpha", BACKGROUND)
+    app.deploy_handle("miriam", "beta", BACKGROUND)
+
+    # The tt- site got a redirect to the new page, and only the first time the handle moved
+    assert moved['netlify_url'] == "https://links-miriam.netlify.app/alpha/"
+    assert moved['redirected_from'] == "https://tt-alpha.netlify.app"
+    app.deploy_handle("miriam", "alpha", BACKGROUND + "?v=2")
+    assert site_deploys(fake_netlify, "site-tt-alpha") == 2
+    assert "/_redirects" in fake_netlify.site_files["site-tt-alpha"]
+    assert app.indexed_site_id("alpha") == "site-tt-alpha"
+
+    # Switched back off: the handle deploys to its own site again, the creator site is left alone
+    monkeypatch.setattr(app, "NETLIFY_CONSOLIDATED_SITES", False)
+    before = site_deploys(fake_netlify, "site-links-miriam")
+    back = app.deploy_handle("miriam", "alpha", BACKGROUND)
+    assert back['site_id'] == "site-tt-alpha"
+    assert back['netlify_url'] == "https://tt-alpha.netlify.app"
+    assert site_deploys(fake_netlify, "site-links-miriam") == before
+    assert "/beta/index.html" in fake_netlify.site_files["site-links-miriam"]
+    assert list(fake_netlify.site_files["site-tt-alpha"]) == ["/index.html"]
+
+
+def test_pages_survive_a_new_database(fake_netlify, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_CONSOLIDATED_SITES", True)
+    app.deploy_creator_pages("miriam", ["alpha", "beta"], BACKGROUND)
+
+    with app.db_connect() as conn:
+        for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            conn.execute(f"DELETE FROM {table}")
+        conn.executescript(app.DATABASE_SCHEMA)
+    app.deploy_creator_pages("miriam", ["gamma"], BACKGROUND)
+
+    assert set(fake_netlify.site_files["site-links-miriam"]) == {
+        "/alpha/index.html", "/beta/index.html", "/gamma/index.html"
+    }
+
+
+def test_handle_sites_backfilled_from_deployments(fake_netlify, monkeypatch):
+    with app.db_connect() as conn:
+        conn.execute("DELETE FROM handle_sites")
+        conn.execute("INSERT INTO creator_sites (creator, site_id) VALUES ('miriam', 'site-links-miriam')")
+        conn.executemany(
+            "INSERT INTO deployments (handle, creator, site_id, created_at) VALUES (?, 'miriam', ?, 0)",
+            [("own", "site-tt-own"), ("moved", "site-links-miriam")]
+        )
+    monkeypatch.setattr(app, "_schema_ready", False)
+
+    assert app.indexed_site_id("own") == "site-tt-own"
+    assert app.indexed_site_id("moved") is None
+
+
+def test_existing_site_found_by_exact_name(fake_netlify, monkeypatch):
+    # Both already in the account, nothing in the index: creating tt-anna answers 422
+    # and looking it up by name also returns my-tt-anna, the more recent one
+    fake_netlify.sites.update({"tt-anna": "site-tt-anna", "my-tt-anna": "site-my-tt-anna"})
+    monkeypatch.setattr(app, "NETLIFY_CONSOLIDATED_SITES", False)
+
+    result = app.deploy_handle("miriam", "anna", BACKGROUND)
+
+    assert result['site_id'] == "site-tt-anna"
+    assert app.indexed_site_id("anna") == "site-tt-anna"
+    assert "site-my-tt-anna" not in fake_netlify.site_files
+
+
+def test_taken_site_name_is_an_error(fake_netlify, monkeypatch):
+    # Netlify refuses tt-anna (another account has it), and only my-tt-anna is ours
+    fake_netlify.sites.update({"my-tt-anna": "site-my-tt-anna"})
+    fake_netlify.taken.add("tt-anna")
+    monkeypatch.setattr(app, "NETLIFY_CONSOLIDATED_SITES", False)
+
+    with pytest.raises(app.DeployError, match="Failed to create site"):
+        app.deploy_handle("miriam", "anna", BACKGROUND)
+    assert "site-my-tt-anna" not in fake_netlify.site_files
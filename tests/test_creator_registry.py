@@ -0,0 +1,60 @@
+"""CreatorRegistry seeding and the config a worker deploy writes"""
+import threading
+
+import app
+
+
+def test_concurrent_first_loads_all_see_the_seed(fresh_db):
+    seen = []
+    barrier = threading.Barrier(8)
+
+    def load():
+        barrier.wait()
+        seen.append(set(app.creator_registry.snapshot()))
+
+    threads = [threading.Thread(target=load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert seen == [set(app.SEED_CREATORS)] * 8
+
+
+def test_worker_deploy_keeps_legacy_worker_and_background(fresh_db, monkeypatch):
+    monkeypatch.setattr(app, "MULTI_TENANT_WORKER", "")
+    before = app.creator_registry.get("suki")
+
+    creator_config, worker_name, _, worker_url = app.worker_deploy_plan(
+        "suki", "https://onlyfans.com/new", "https://onlyfans.com/new-de")
+    app.register_creator_config("suki", creator_config)
+
+    after = app.creator_registry.get("suki")
+    assert worker_name == "suki2"
+    assert worker_url == "https://suki2.signaturenorthwest.workers.dev"
+    assert after == {**before, "of_us": "https://onlyfans.com/new", "of_de": "https://onlyfans.com/new-de",
+                     "has_dach": True}
+
+
+def test_new_creator_gets_a_default_worker(fresh_db, monkeypatch):
+    monkeypatch.setattr(app, "MULTI_TENANT_WORKER", "")
+
+    creator_config, worker_name, _, _ = app.worker_deploy_plan("newbie", "https://onlyfans.com/n", "https://onlyfans.com/n")
+    app.register_creator_config("newbie", creator_config)
+
+    assert worker_name == "newbie2"
+    assert app.creator_registry.get("newbie") == {"of_us": "https://onlyfans.com/n", "of_de": None, "has_dach": False}
+
+
+def test_leaving_the_shared_worker_drops_the_flag(fresh_db, monkeypatch):
+    monkeypatch.setattr(app, "MULTI_TENANT_WORKER", "links")
+    config, worker_name, _, _ = app.worker_deploy_plan("mira", "https://onlyfans.com/m", "https://onlyfans.com/m")
+    app.register_creator_config("mira", config)
+    assert worker_name == "links"
+    assert app.creator_registry.get("mira")["multi_tenant"]
+
+    monkeypatch.setattr(app, "MULTI_TENANT_WORKER", "")
+    config, worker_name, _, _ = app.worker_deploy_plan("mira", "https://onlyfans.com/m", "https://onlyfans.com/m")
+    app.register_creator_config("mira", config)
+    assert worker_name == "mira2"
+    assert "multi_tenant" not in app.creator_registry.get("mira")
@@ -0,0 +1,44 @@
+"""The shared worker, and the own scripts of creators that moved onto it, against a fake Cloudflare"""
+import pytest
+
+import app
+from fake_providers import FakeCloudflare
+
+
+@pytest.fixture
+def cloudflare(fresh_db, monkeypatch):
+    monkeypatch.setattr(app, "MULTI_TENANT_WORKER", "links")
+    monkeypatch.setattr(app, "SUPABASE_SERVICE_KEY", "")
+    with FakeCloudflare() as fake:
+        monkeypatch.setattr(app.cloudflare_api, "base_url", fake.api_url)
+        yield fake
+
+
+def test_moving_creator_keeps_its_own_script_current(cloudflare):
+    result = app.deploy_worker("aurelia", "https://onlyfans.com/aurelia-new", "https://onlyfans.com/aurelia-new")
+
+    assert result['worker_url'] == "https://links.signaturenorthwest.workers.dev/aurelia"
+    assert sorted(cloudflare.uploads()) == ["aurelia2", "links"]
+    assert b"onlyfans.com/aurelia-new" in cloudflare.scripts["aurelia2"]
+    assert app.creator_registry.get("aurelia")["worker"] == "aurelia2"
+    assert b"WORKER_ALIASES" not in cloudflare.scripts["links"]
+
+
+def test_new_creator_only_gets_the_shared_script(cloudflare):
+    app.deploy_worker("newbie", "https://onlyfans.com/newbie", "https://onlyfans.com/newbie")
+
+    assert cloudflare.uploads() == ["links"]
+    assert "worker" not in app.creator_registry.get("newbie")
+
+
+def test_redeploy_updates_legacy_scripts_of_moved_creators(cloudflare):
+    app.deploy_worker("aurelia", "https://onlyfans.com/aurelia-new", "https://onlyfans.com/aurelia-new")
+    app.deploy_worker("newbie", "https://onlyfans.com/newbie", "https://onlyfans.com/newbie")
+    cloudflare.requests.clear()
+
+    results = list(app.iter_redeploy_results(app.creator_registry.snapshot(), force=True))
+
+    uploaded = cloudflare.uploads()
+    assert "aurelia2" in uploaded and "links" in uploaded and "miri2" in uploaded
+    assert "newbie2" not in uploaded
+    assert len(results) == len(uploaded) == len(app.SEED_CREATORS) + 1
@@ -0,0 +1,49 @@
+"""Round trips of digest and zip deploys, against the fake Netlify"""
+import io
+
+import pytest
+from PIL import Image
+
+import app
+
+
+@pytest.fixture(scope="module")
+def image():
+    buf = io.BytesIO()
+    Image.effect_noise((1600, 1000), 60).convert("RGB").save(buf, "JPEG")
+    return app.compress_background_image(buf.getvalue())
+
+
+def deploy(handle, image):
+    html = app.generate_netlify_html("https://miri2.example.workers.dev", handle, image=image)
+    return app.deploy_netlify_site(handle, html, image)
+
+
+def test_digest_mode_uploads_each_missing_file(fake_netlify, image, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "digest")
+    first, second, again = deploy("one", image), deploy("two", image), deploy("one", image)
+
+    # create site, create deploy, a PUT for index.html and each image file, ready poll;
+    # later deploys only upload their HTML, or nothing if it's unchanged
+    assert first['round_trips'] == 2 + 1 + len(image.files) + 1
+    assert second['round_trips'] == 4
+    assert again['round_trips'] == 2
+    assert fake_netlify.count("PUT", r"^/deploys/") == len(image.files) + 2
+
+
+def test_zip_mode_is_one_request_per_deploy(fake_netlify, image, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "zip")
+    first, second = deploy("one", image), deploy("two", image)
+
+    assert (first['deploy_mode'], first['round_trips']) == ('zip', 3)
+    assert (second['deploy_mode'], second['round_trips']) == ('zip', 3)
+    assert fake_netlify.count("PUT", r"^/deploys/") == 0
+
+
+def test_auto_mode_zips_only_mostly_new_content(fake_netlify, image, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_DEPLOY_MODE", "auto")
+    first, second = deploy("one", image), deploy("two", image)
+
+    # The second handle only adds its HTML, the background's digests are known by then
+    assert (first['deploy_mode'], first['round_trips']) == ('zip', 3)
+    assert (second['deploy_mode'], second['round_trips']) == ('digest', 4)
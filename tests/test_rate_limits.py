@@ -0,0 +1,85 @@
+"""ProviderClient pacing against a fake Netlify that enforces a quota"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+from fake_providers import FakeNetlify, Quota
+
+
+@pytest.fixture
+def netlify():
+    """A fake Netlify with one site, and a fresh client (and limiter) for it"""
+    def start(quota):
+        fake = FakeNetlify(quota=quota).__enter__()
+        fakes.append(fake)
+        fake.sites['tt-quota'] = 'site-tt-quota'
+        return fake, app.ProviderClient("netlify", fake.api_url, dict)
+
+    fakes = []
+    yield start
+    for fake in fakes:
+        fake.__exit__(None, None, None)
+
+
+def test_429s_pause_the_provider_and_every_attempt_is_paced(netlify):
+    fake, client = netlify(Quota(limit=3, window=2, headers=False))
+
+    statuses = [client.get("/sites", params={"name": "tt-quota"}).status_code for _ in range(6)]
+
+    # The 429 came back to request(), not to urllib3: every attempt went through the
+    # limiter (and was counted), and the whole provider was slowed down
+    assert statuses == [200] * 6
+    assert fake.quota.rejected >= 1
+    assert client.thread_calls() == len(fake.requests)
+    assert client.limiter.paused_until > 0
+    assert client.limiter.rate < app.PROVIDER_RATE_LIMITS["netlify"][0]
+
+
+def test_request_deadline_caps_the_wait(netlify):
+    fake, client = netlify(Quota(limit=1, window=60, headers=False))
+
+    def in_request():
+        app.provider_deadline.set(time.monotonic() + 1)
+        started = time.monotonic()
+        first = client.get("/sites").status_code
+        # Retry-After is ~60 s, past the deadline: the 429 is returned instead of waiting
+        second = client.get("/sites").status_code
+        with pytest.raises(app.RateLimitWaitExceeded):
+            client.get("/sites")  # the provider is paused, so this one doesn't even try
+        return first, second, time.monotonic() - started
+
+    first, second, elapsed = contextvars.copy_context().run(in_request)
+    assert (first, second) == (200, 429)
+    assert elapsed < 5
+    assert len(fake.requests) == 2
+
+
+def test_requests_get_a_provider_deadline():
+    def in_request():
+        with app.app.test_request_context('/api/jobs/x'):
+            app.app.preprocess_request()
+            return app.provider_deadline.get()
+
+    # The before_request hook sets the contextvar, keep it out of later tests
+    deadline = contextvars.copy_context().run(in_request)
+    assert app.provider_deadline.get() is None
+    assert deadline is not None
+    assert 0 < deadline - time.monotonic() <= app.REQUEST_PROVIDER_DEADLINE
+
+
+def test_pool_holds_every_concurrent_call(netlify, caplog):
+    fake, client = netlify(None)
+    fake.latency = 0.2
+    client.limiter = app.RateLimiter(1000.0, 1000)
+    threads = (app.JOB_CONCURRENCY + 1) * app.BULK_DEPLOY_CONCURRENCY
+
+    # Every job running a full bulk fan-out next to a bulk request, twice over the same connections
+    with caplog.at_level("WARNING", logger="urllib3.connectionpool"):
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for _ in range(2):
+                assert set(pool.map(lambda _: client.get("/sites").status_code, range(threads))) == {200}
+
+    assert not [r for r in caplog.records if "Connection pool is full" in r.getMessage()]
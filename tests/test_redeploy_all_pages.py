@@ -0,0 +1,56 @@
+"""redeploy-all-pages against the fake Netlify"""
+import json
+
+import pytest
+
+import app
+
+BACKGROUND = "https://assets-miriam.netlify.app/background.jpg"
+
+
+@pytest.fixture
+def client(fake_netlify, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_API_TOKEN", "test-token")
+    monkeypatch.setattr(app, "NETLIFY_CONSOLIDATED_SITES", False)
+    return app.app.test_client()
+
+
+def test_reports_unindexed_tt_sites(client, fake_netlify, monkeypatch):
+    monkeypatch.setattr(app, "NETLIFY_SITES_PAGE_SIZE", 2)
+    app.deploy_handle("miriam", "indexed", BACKGROUND)
+    for name in ("tt-legacy", "tt-older", "links-miriam", "my-tt-site"):
+        fake_netlify.sites[name] = f"site-{name}"
+
+    body = client.post("/api/redeploy-all-pages").get_json()
+
+    assert body['success']
+    assert body['unindexed'] == ["legacy", "older"]
+    assert body['unchanged'] == 1
+    assert [r['reason'] for r in body['results'] if r['handle'] == "legacy"] == [app.PAGE_NOT_INDEXED]
+    # Five matching sites, two per page
+    assert fake_netlify.count("GET", r"^/sites$") == 3
+
+
+def test_creators_filter_skips_the_site_listing(client, fake_netlify):
+    fake_netlify.sites["tt-legacy"] = "site-tt-legacy"
+
+    body = client.post("/api/redeploy-all-pages?creators=miriam").get_json()
+
+    assert body['success']
+    assert body['unindexed'] == []
+    assert fake_netlify.count("GET", r"^/sites$") == 0
+
+
+def test_unknown_creator_is_rejected(client):
+    body = client.post("/api/redeploy-all-pages", json={"creators": ["nobody"]}).get_json()
+    assert body == {'success': False, 'error': "Unknown creators: nobody"}
+
+
+def test_stream_counts_unindexed_sites(client, fake_netlify):
+    app.deploy_handle("miriam", "indexed", BACKGROUND)
+    fake_netlify.sites["tt-legacy"] = "site-tt-legacy"
+
+    lines = [json.loads(line) for line in client.post("/api/redeploy-all-pages?stream=1").data.splitlines()]
+
+    assert [(line['completed'], line['total']) for line in lines[:-1]] == [(1, 2), (2, 2)]
+    assert lines[-1]['done'] and lines[-1]['unindexed'] == ["legacy"]
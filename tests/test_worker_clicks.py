@@ -0,0 +1,80 @@
+"""Subrequests per click of the generated worker, measured against a stub Supabase"""
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+import app
+from stub_supabase import StubSupabase
+
+HARNESS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker_harness.mjs")
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="node is needed to run the worker")
+
+
+def run_worker(tmp_path, code, clicks):
+    """Send clicks through worker code with its Supabase calls going to a fresh stub"""
+    stub = StubSupabase()
+    with stub:
+        worker = tmp_path / "worker.mjs"
+        worker.write_text(re.sub(r'const SUPABASE_URL = "[^"]*";', f'const SUPABASE_URL = "{stub.url}";', code))
+        clicks_file = tmp_path / "clicks.json"
+        clicks_file.write_text(json.dumps(clicks))
+        result = subprocess.run(["node", HARNESS, str(worker), str(clicks_file)],
+                                capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout)["statuses"] == [302] * len(clicks)
+    return stub
+
+
+def visitors(count, distinct):
+    return [{"ip": f"10.0.0.{i % distinct}"} for i in range(count)]
+
+
+@pytest.mark.parametrize("dedup, per_new_click", [("select", 2), ("rpc", 1)])
+def test_subrequests_per_new_visitor(tmp_path, dedup, per_new_click):
+    code = app.generate_worker_code("miriam", "https://onlyfans.com/x", None, dedup, 0)
+    stub = run_worker(tmp_path, code, visitors(12, 12))
+
+    assert len(stub.rows) == 12
+    assert len(stub.requests) == 12 * per_new_click
+    assert all(row["is_unique"] for row in stub.rows)
+
+
+@pytest.mark.parametrize("dedup", ["select", "rpc"])
+def test_repeat_visitor_is_one_insert(tmp_path, dedup):
+    code = app.generate_worker_code("miriam", "https://onlyfans.com/x", None, dedup, 0)
+    stub = run_worker(tmp_path, code, visitors(12, 4))
+
+    # Fingerprints already seen by the isolate skip the lookup and log straight away
+    assert len(stub.rows) == 12
+    assert len(stub.requests) == 4 * (2 if dedup == "select" else 1) + 8
+    assert [row["is_unique"] for row in stub.rows].count(True) == 4
+
+
+@pytest.mark.parametrize("dedup, requests", [("select", 4), ("rpc", 3)])
+def test_batched_rows_per_request(tmp_path, dedup, requests):
+    code = app.generate_worker_code("miriam", "https://onlyfans.com/x", None, dedup, 10, 2000)
+    stub = run_worker(tmp_path, code, visitors(25, 8))
+
+    # Flushed at 10, 20 and by the age timer for the last 5. In select mode only the
+    # first batch has fingerprints the isolate hasn't seen, so only it needs a lookup
+    assert len(stub.rows) == 25
+    assert len(stub.requests) == requests
+    assert len(stub.rows) / len(stub.requests) >= 25 / 4
+    assert [row["is_unique"] for row in stub.rows].count(True) == 8
+
+
+@pytest.mark.parametrize("dedup", ["select", "rpc"])
+def test_batch_flushes_on_age(tmp_path, dedup):
+    code = app.generate_worker_code("miriam", "https://onlyfans.com/x", None, dedup, 10, 200)
+    stub = run_worker(tmp_path, code, visitors(3, 3))
+
+    # Never reaches the batch size; the first click's timer flushes all three together
+    assert len(stub.rows) == 3
+    assert [request for request in stub.requests if request[0] == "POST"] == [
+        ("POST", "/rest/v1/link_clicks" if dedup == "select" else "/rest/v1/rpc/log_clicks")
+    ]
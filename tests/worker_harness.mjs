@@ -0,0 +1,33 @@
+// Runs a generated worker script under node against a stub Supabase
+//
+//   node worker_harness.mjs <worker.mjs> <clicks.json>
+//
+// clicks.json is a list of {ip, country} visitors. Each one is sent through the
+// worker's fetch handler; every ctx.waitUntil() promise (the background logging)
+// is awaited before exiting, so the stub has seen all subrequests afterwards.
+import { readFile } from "node:fs/promises";
+import { pathToFileURL } from "node:url";
+
+const [workerPath, clicksPath] = process.argv.slice(2);
+const worker = (await import(pathToFileURL(workerPath).href)).default;
+const clicks = JSON.parse(await readFile(clicksPath, "utf8"));
+
+const UA = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+  + "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1";
+const pending = [];
+const ctx = { waitUntil: promise => pending.push(promise) };
+const statuses = [];
+
+for (const click of clicks) {
+  const request = new Request("https://miri2.signaturenorthwest.workers.dev/?acc=harness", {
+    headers: { "user-agent": UA, "CF-Connecting-IP": click.ip },
+  });
+  // node's Request has no cf property, the worker reads the country from it
+  Object.defineProperty(request, "cf", { value: { country: click.country || "US" } });
+  const response = await worker.fetch(request, {}, ctx);
+  statuses.push(response.status);
+}
+// waitUntil callbacks can register more work (batched flushes), drain until quiet
+for (let i = 0; i < pending.length; i++) await pending[i];
+
+console.log(JSON.stringify({ statuses }));